@@ -0,0 +1,22 @@
+"""
+ASGI config for EcoFlux project in production, served by uvicorn (see
+Project_resources/Deployment_guide.org).
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+# Close database connections after each request, see
+# EcoFlux/settings/production.py
+os.environ.setdefault("DB_CONNECTIONS", "pooled")
+
+from django.core.asgi import get_asgi_application
+
+application = get_asgi_application()
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "EcoFlux.settings")
+# Close database connections after each request, see
+# EcoFlux/settings/production.py
+os.environ.setdefault("DB_CONNECTIONS", "pooled")
 
 application = get_asgi_application()
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that its times cover everything else
+    "inventory.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -136,8 +138,91 @@ SESSION_COOKIE_AGE = 259200
 # Photo uploads
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+# Seconds browsers may keep media files without asking again. File names
+# are never reused (see inventory.views.serve_media), so a year is safe.
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
 SITE_PHOTO_UPLOAD_SUBDIR = "site_photos/"
 DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+# Chunked uploads: the size of chunk the upload page sends, and the
+# largest chunk the server accepts in one request.
+PHOTO_UPLOAD_CHUNK_SIZE = 1024 * 1024
+PHOTO_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Uploads are checked from their first bytes and header before they're
+# stored (inventory.images.check_image): the Pillow formats accepted,
+# the most pixels an image may have (a limit on the memory needed to
+# decode it), and how much of a file may be read to find its header.
+PHOTO_UPLOAD_FORMATS = ["JPEG", "PNG", "WEBP", "TIFF"]
+PHOTO_UPLOAD_MAX_PIXELS = 120_000_000
+PHOTO_UPLOAD_HEADER_BYTES = 1024 * 1024
+# Display copies built for each photo: longest side in pixels per kind,
+# and the encodings to build at each size. AVIF is skipped if Pillow
+# was built without it.
+PHOTO_DERIVATIVE_SIZES = {
+    "thumbnail": 400,
+    "medium": 1200,
+}
+PHOTO_DERIVATIVE_FORMATS = ["jpeg", "webp", "avif"]
+PHOTO_DERIVATIVE_QUALITY = 80
+# Background processing of uploaded photos (manage.py run_photo_jobs).
+# Failed jobs are retried after PHOTO_JOB_RETRY_DELAY * 2**attempts
+# seconds; RUNNING jobs older than PHOTO_JOB_STALE_AFTER seconds are
+# assumed to belong to a dead worker and are requeued.
+PHOTO_JOB_MAX_ATTEMPTS = 5
+PHOTO_JOB_RETRY_DELAY = 30
+PHOTO_JOB_STALE_AFTER = 600
+PHOTO_JOB_POLL_INTERVAL = 2
+# Worker processes that resize photos in parallel (inventory/engine.py),
+# for run_photo_jobs and build_photo_derivatives: None for one per CPU,
+# 0 to resize in the worker itself.
+PHOTO_PROCESS_WORKERS = None
+
+# Caching
+# The list views cache their rendered tables, invalidated by per-model
+# version numbers kept in the same cache (see inventory/cache.py).
+# "locmem" is per process, so only suits a single-process server; use
+# "file" or "db" (after manage.py createcachetable) otherwise.
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "inventory_cache",
+    },
+}
+CACHES = {
+    "default": CACHE_BACKENDS[config("CACHE_BACKEND", default="locmem")],
+}
+INVENTORY_CACHE_ALIAS = "default"
+# Seconds; 0 turns list caching off
+INVENTORY_LIST_CACHE_TIMEOUT = config(
+    "INVENTORY_LIST_CACHE_TIMEOUT", default=60 * 60, cast=int
+)
+
+# Rows read per query when streaming a list export (inventory/exports.py)
+EXPORT_BATCH_SIZE = 2000
+
+# Rows saved per bulk_create transaction by spreadsheet imports
+# (inventory/imports.py)
+IMPORT_BATCH_SIZE = 1000
+
+# Full-text search (inventory/search.py): most results a search returns
+SEARCH_RESULTS_LIMIT = 200
+
+# Read replica (inventory/routers.py, used if DATABASES has "replica"):
+# seconds the replica may lag the primary. Users read from the primary
+# for this long after a write of theirs, and list tables read from the
+# replica are cached no longer than this.
+DB_REPLICA_MAX_LAG = config("DB_REPLICA_MAX_LAG", default=10, cast=int)
+
+# Request metrics (inventory/metrics.py): send query counts and timings
+# to the browser in a Server-Timing header. Off unless DEBUG: they tell
+# anyone what the backend is doing, and help time requests against it.
+SERVER_TIMING = config("SERVER_TIMING", default=DEBUG, cast=bool)
 
 # crispy-forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = ("bootstrap5",)
@@ -146,8 +231,9 @@ CRISPY_FAIL_SILENTLY = not DEBUG
 
 DJANGO_SETTINGS_MODULE = config("DJANGO_SETTINGS_MODULE")
 
-# Logging
+# Logging, see inventory/logs.py
 LOG_DIR = os.path.join(BASE_DIR, "logs")
+LOG_FILE = os.path.join(LOG_DIR, "django_logs.log")
 
 LOGGING = {
     "version": 1,
@@ -158,6 +244,10 @@ LOGGING = {
             "style": "{",
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "json": {
+            "()": "inventory.logs.JsonFormatter",
+            "datefmt": "%Y-%m-%dT%H:%M:%S",
+        },
     },
     "handlers": {
         "console": {
@@ -166,27 +256,47 @@ LOGGING = {
         },
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
-            "filename": os.path.join(LOG_DIR, "django_logs.log"),
+            "filename": LOG_FILE,
             "maxBytes": 1024 * 1024 * 100,
             "backupCount": 9,
-            "formatter": "with_datetime",
+            "formatter": "json",
+        },
+        # The loggers use these, which hand records to a thread that
+        # writes them out. Their names must sort after "console" and
+        # "file".
+        "queue": {
+            "()": "inventory.logs.QueueListenerHandler",
+            "handlers": ["cfg://handlers.console", "cfg://handlers.file"],
+            "volume_interval": config("LOG_VOLUME_INTERVAL", default=3600, cast=int),
+        },
+        "queue_file": {
+            "()": "inventory.logs.QueueListenerHandler",
+            "handlers": ["cfg://handlers.file"],
+            "volume_interval": config("LOG_VOLUME_INTERVAL", default=3600, cast=int),
         },
     },
     "loggers": {
         "inventory": {  # Use the name of your app's logger
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False,
         },
+        # A line per request from inventory/metrics.py; set to WARNING
+        # to log only requests over their query budget
+        "inventory.metrics": {
+            "handlers": ["queue_file"],
+            "level": config("METRICS_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
         "django": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "WARN",
             "propagate": False,
         },
     },
     # Fallback logger
     "root": {
-        "handlers": ["console", "file"],
+        "handlers": ["queue"],
         "level": "INFO",
     },
 }
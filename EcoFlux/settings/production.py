@@ -17,6 +17,18 @@ ADMINS = [
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# How connections are reused:
+# - "persistent" (mod_wsgi): each worker thread keeps its connection
+#   open for DB_CONN_MAX_AGE seconds, checked before it's reused,
+#   instead of connecting afresh for every request.
+# - "pooled" (EcoFlux/asgi.py sets this): under ASGI a request's queries
+#   may run on any thread, so Django closes connections after each
+#   request. Django only pools PostgreSQL connections itself; for MySQL,
+#   set DB_POOL_HOST/DB_POOL_PORT to a pooling proxy such as ProxySQL
+#   or MySQL Router, so that closing and reconnecting is cheap.
+DB_CONNECTIONS = config("DB_CONNECTIONS", default="persistent")
+DB_POOLED = DB_CONNECTIONS == "pooled"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.mysql",
@@ -25,8 +37,41 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD", default="default_pass"),
         "HOST": config("DB_HOST", default="localhost"),
         "PORT": config("DB_PORT", default="3306"),
+        "CONN_MAX_AGE": (
+            0 if DB_POOLED else config("DB_CONN_MAX_AGE", default=600, cast=int)
+        ),
+        "CONN_HEALTH_CHECKS": not DB_POOLED,
     }
 }
+if DB_POOLED:
+    DATABASES["default"]["HOST"] = config(
+        "DB_POOL_HOST", default=DATABASES["default"]["HOST"]
+    )
+    DATABASES["default"]["PORT"] = config(
+        "DB_POOL_PORT", default=DATABASES["default"]["PORT"]
+    )
+
+# Optional read replica for the list views (see inventory/routers.py):
+# set DB_REPLICA_HOST to use one. It takes the primary's credentials
+# unless given its own.
+if config("DB_REPLICA_HOST", default=""):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": config("DB_REPLICA_HOST"),
+        "PORT": config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "USER": config("DB_REPLICA_USER", default=DATABASES["default"]["USER"]),
+        "PASSWORD": config(
+            "DB_REPLICA_PASSWORD", default=DATABASES["default"]["PASSWORD"]
+        ),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["inventory.routers.ReplicaRouter"]
+    MIDDLEWARE += ["inventory.routers.RecentWriteMiddleware"]
+
+# mod_wsgi runs several processes, which must share cache versions
+CACHES = {
+    "default": CACHE_BACKENDS[config("CACHE_BACKEND", default="file")],
+}
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
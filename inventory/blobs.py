@@ -0,0 +1,83 @@
+"""Reference-counted photo files.
+
+Photos are stored by content (inventory/storage.py), so several Photos
+can share one file. Each file has a PhotoBlob row whose ref_count, a
+counter column kept by inventory/counters.py, counts the Photos using
+it. When a delete takes the count to zero, collect() deletes the file
+and the row once the transaction has committed.
+
+Storing a photo takes two steps, so that the slow one can run off the
+thread an async view uses for database work:
+
+    name = store(file)                  # hash and write; no queries
+    photo = create_photo(name, file, fieldnote=..., ...)
+
+create_photo() locks the blob row, so a collect() of the same content
+running at the same time either finishes first (and the file is
+written again) or sees the new reference and leaves the file alone.
+
+"""
+
+import logging
+import os
+
+from django.db import transaction
+
+from .models import Photo, PhotoBlob
+from .storage import blob_storage
+
+logger = logging.getLogger("inventory")
+
+
+def store(file):
+    """Write file (a django File) to the photo store and return its
+    storage name. Makes no database queries."""
+    # Only the extension is used; an opened file's name is a full path
+    return blob_storage.save(os.path.basename(file.name), file)
+
+
+def blob_for(name, file):
+    """Return the PhotoBlob of stored file name, locked until the end of
+    the transaction, creating it if need be. file is the content, to
+    write again in case the blob was collected since store()."""
+    blob, _ = PhotoBlob.objects.select_for_update().get_or_create(
+        file=name, defaults={"size": file.size}
+    )
+    if not blob_storage.exists(name):
+        store(file)
+    return blob
+
+
+def create_photo(name, file, **fields):
+    """Create a Photo of the file store() saved as name."""
+    with transaction.atomic():
+        blob = blob_for(name, file)
+        # Counting the reference is left to the post_save receivers
+        return Photo.objects.create(photo=name, blob=blob, **fields)
+
+
+def collect(blob_id):
+    """Delete the blob's file and row if no Photo uses it any more."""
+    with transaction.atomic():
+        blob = (
+            PhotoBlob.objects.select_for_update()
+            .filter(pk=blob_id, ref_count=0)
+            .first()
+        )
+        # The count can lag behind a bulk update, see counters.py
+        if blob is None or blob.photos.exists():
+            return
+        blob.delete()
+        blob_storage.delete(blob.file)
+    logger.info(
+        "Deleted unused photo file %s",
+        blob.file,
+        extra={"action": "collected", "file": blob.file, "size": blob.size},
+    )
+
+
+def collect_on_commit(blob_id):
+    """Run collect(blob_id) once the current transaction commits, as
+    delete_on_commit() does for files of their own."""
+    if blob_id is not None:
+        transaction.on_commit(lambda: collect(blob_id))
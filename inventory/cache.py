@@ -0,0 +1,64 @@
+"""Versioned caching of rendered list tables.
+
+Each inventory model has a version number in the cache, bumped by the
+post_save/post_delete receivers in inventory/signals.py. A cached table
+is keyed on the view, the normalized query string and the versions of
+the models it shows, so any change to those models makes every old
+entry unreachable at once, and nothing else does.
+
+Versions live in the cache too, so all processes must share one cache:
+use the file or database backend (CACHE_BACKEND) anywhere with more
+than one worker process. Queryset update() and bulk_create() send no
+signals; call bump_version() after using them.
+
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+
+def get_cache():
+    return caches[settings.INVENTORY_CACHE_ALIAS]
+
+
+def version_key(model):
+    return f"inventory:version:{model._meta.label_lower}"
+
+
+def bump_version(model):
+    cache = get_cache()
+    key = version_key(model)
+    # add() is a no-op if the key exists; then incr() is atomic on
+    # backends that support it.
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_versions(models):
+    keys = [version_key(model) for model in models]
+    versions = get_cache().get_many(keys)
+    return ".".join(str(versions.get(key, 0)) for key in keys)
+
+
+def normalized_query(querydict):
+    """The query string with parameters sorted and empty ones dropped,
+    so equivalent URLs share a cache entry."""
+    items = sorted(
+        (key, value) for key, values in querydict.lists() for value in values if value
+    )
+    return "&".join(f"{key}={value}" for key, value in items)
+
+
+def list_cache_key(view_name, querydict, versions, source=DEFAULT_DB_ALIAS):
+    """versions as returned by get_versions(); source is the database
+    alias the table is read from, as tables read from a lagging replica
+    mustn't be served to users who read the primary (inventory/routers.py)."""
+    query = hashlib.md5(normalized_query(querydict).encode()).hexdigest()
+    return f"inventory:list:{view_name}:{source}:{versions}:{query}"
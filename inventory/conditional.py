@@ -0,0 +1,33 @@
+"""Validators for conditional GETs (see ConditionalGetMixin in views.py).
+
+Pages are compared with the browser's copy using the updated_at
+timestamps of the rows they show, which auto_now maintains on save.
+Counter updates (inventory/counters.py) touch the parent too, so adding
+or deleting a child changes its parent's timestamp. Deleting a row
+leaves nothing behind to look at, which is why the list views also mix
+the cache versions of inventory/cache.py into their ETags.
+
+"""
+
+import hashlib
+
+from django.db.models import Max
+
+
+def latest_update(*querysets):
+    """The most recent updated_at among the rows of querysets, or None
+    if they're all empty. One indexed MAX() query per queryset."""
+    stamps = [qs.aggregate(latest=Max("updated_at"))["latest"] for qs in querysets]
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+def make_etag(request, *parts):
+    """An ETag for one user's view of a page made from parts.
+
+    The session key is mixed in as pages carry the user's name and CSRF
+    token, which both change on logging in again.
+    """
+    key = "|".join(
+        str(part) for part in (request.user.pk, request.session.session_key, *parts)
+    )
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,131 @@
+"""Denormalized row counts.
+
+These counter columns replace COUNT() JOINs in the list views:
+
+    Site.fieldnotes_count, Site.equipment_count, Site.photo_count
+    FieldNote.photo_count
+    Equipment.history_count
+    PhotoBlob.ref_count (the Photos sharing a stored file)
+
+The receivers in inventory/signals.py keep them up to date as rows are
+created, deleted or moved to another parent through the ORM, inside the
+same transaction as the change itself (see CountedModel). Queryset
+update() and bulk_create() don't send signals, so call
+rebuild_counters() (or `manage.py rebuild_counters`) after using them,
+or count_created() for the rows a bulk_create() made.
+
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from .models import Equipment, FieldNote, History, Photo, PhotoBlob, Site
+
+# Foreign keys to the parents whose counters count a row
+PARENT_FIELDS = ("site", "item", "fieldnote", "blob")
+
+
+def adjust(model, pk, field, delta):
+    """Add delta to model(pk).field with a single UPDATE, marking the
+    row as updated."""
+    if pk is None or not delta:
+        return
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        # Never go below zero (a rebuild will straighten out any drift)
+        rows = rows.filter(**{f"{field}__gte": -delta})
+    # The count is part of the parent's content, see conditional.py
+    rows.update(**{field: F(field) + delta, "updated_at": now()})
+
+
+def site_of_fieldnote(fieldnote_id):
+    return (
+        FieldNote.objects.filter(pk=fieldnote_id)
+        .values_list("site_id", flat=True)
+        .first()
+    )
+
+
+def counted_parents(instance):
+    """Return (model, pk, counter field) for each counter that counts
+    instance."""
+    if isinstance(instance, FieldNote):
+        return [(Site, instance.site_id, "fieldnotes_count")]
+    if isinstance(instance, Equipment):
+        return [(Site, instance.site_id, "equipment_count")]
+    if isinstance(instance, History):
+        return [(Equipment, instance.item_id, "history_count")]
+    if isinstance(instance, Photo):
+        return [
+            (FieldNote, instance.fieldnote_id, "photo_count"),
+            (Site, site_of_fieldnote(instance.fieldnote_id), "photo_count"),
+            (PhotoBlob, instance.blob_id, "ref_count"),
+        ]
+    return []
+
+
+def count_added(instance):
+    for model, pk, field in counted_parents(instance):
+        adjust(model, pk, field, 1)
+
+
+def count_removed(instance):
+    for model, pk, field in counted_parents(instance):
+        adjust(model, pk, field, -1)
+
+
+def count_created(instances):
+    """count_added() for many new rows, e.g. after bulk_create(): one
+    UPDATE per parent that got new children."""
+    deltas = Counter(
+        parent for instance in instances for parent in counted_parents(instance)
+    )
+    for (model, pk, field), delta in deltas.items():
+        adjust(model, pk, field, delta)
+
+
+def count_moved(old, new):
+    """Update counters for a row whose parent(s) changed from old's to
+    new's."""
+    if all(
+        getattr(old, f"{name}_id", None) == getattr(new, f"{name}_id", None)
+        for name in PARENT_FIELDS
+    ):
+        return
+    before, after = counted_parents(old), counted_parents(new)
+    for (model, old_pk, field), (_, new_pk, _) in zip(before, after):
+        if old_pk != new_pk:
+            adjust(model, old_pk, field, -1)
+            adjust(model, new_pk, field, 1)
+    # A field note takes its photos with it to the new site
+    if isinstance(old, FieldNote) and old.site_id != new.site_id:
+        adjust(Site, old.site_id, "photo_count", -old.photo_count)
+        adjust(Site, new.site_id, "photo_count", old.photo_count)
+
+
+def count_of(model, parent_lookup):
+    """Subquery counting model rows whose parent_lookup is the outer
+    row."""
+    counts = (
+        model.objects.filter(**{parent_lookup: OuterRef("pk")})
+        .order_by()
+        .values(parent_lookup)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def rebuild_counters():
+    """Recompute every counter from scratch, one UPDATE per column."""
+    Site.objects.update(
+        fieldnotes_count=count_of(FieldNote, "site"),
+        equipment_count=count_of(Equipment, "site"),
+        photo_count=count_of(Photo, "fieldnote__site"),
+    )
+    FieldNote.objects.update(photo_count=count_of(Photo, "fieldnote"))
+    Equipment.objects.update(history_count=count_of(History, "item"))
+    PhotoBlob.objects.update(ref_count=count_of(Photo, "blob"))
@@ -0,0 +1,166 @@
+"""Parallel photo processing.
+
+Resizing and encoding derivatives is CPU-bound, and one Python process
+only keeps one core busy with it. PhotoProcessor runs the CPU-bound part,
+images.render_derivatives(), in a pool of worker processes, and saves
+what they send back in the calling process:
+
+    with PhotoProcessor(workers=4) as processor:
+        for photo, error in processor.process(photos):
+            ...
+
+Workers are given a file path and send back encoded bytes. They make no
+queries, so the calling process keeps the only database connection
+(SQLite allows one writer anyway) and all the transactions.
+
+Workers are started with "spawn" rather than forked, so that they don't
+inherit the logging listener threads of inventory/logs.py, locks held
+by other threads, or open database connections.
+
+Photos are handed out as workers become free, with at most two per
+worker in flight, so a generator of photos (e.g. claimed jobs) is read
+only that far ahead. The first ^C, or cancel(), stops handing them
+out; the photos already being processed are finished and saved. A
+second ^C stops at once.
+
+"""
+
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+
+logger = logging.getLogger("inventory")
+
+
+def cpu_count():
+    """The number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def start_worker():
+    # ^C goes to the whole process group: leave it to the parent, which
+    # lets the workers finish what they have
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import django
+
+    django.setup()
+
+
+def render_derivatives(path):
+    # Workers import this module to find start_worker() before Django is
+    # set up, so it mustn't import models (through images) until then
+    from .images import render_derivatives
+
+    return render_derivatives(path)
+
+
+def original_path(photo):
+    return photo.photo.path
+
+
+class PhotoProcessor:
+    """A pool of worker processes building photo derivatives. workers
+    defaults to settings.PHOTO_PROCESS_WORKERS, None meaning one per
+    CPU; with 0 the photos are processed in this process."""
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = settings.PHOTO_PROCESS_WORKERS
+        if workers is None:
+            workers = cpu_count()
+        self.workers = workers
+        self.max_pending = 2 * max(workers, 1)
+        self.cancelled = threading.Event()
+        self.pool = None
+        self.previous_handler = None
+
+    def __enter__(self):
+        if self.workers:
+            self.pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=get_context("spawn"),
+                initializer=start_worker,
+            )
+        if threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGINT, self.interrupt)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGINT, self.previous_handler)
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def interrupt(self, signum, frame):
+        if self.cancelled.is_set():
+            raise KeyboardInterrupt
+        logger.warning("Interrupted: finishing the photos being processed.")
+        self.cancel()
+
+    def cancel(self):
+        """Stop taking photos; those in flight are still finished."""
+        self.cancelled.set()
+
+    def render(self, items, path=original_path):
+        """Yield (item, rendered, error) for each of items, in the order
+        they are done: rendered is what render_derivatives() returned
+        for the file path(item), or None and error the exception it
+        raised."""
+        items = iter(items)
+        if self.pool is None:
+            while not self.cancelled.is_set():
+                item = next(items, None)
+                if item is None:
+                    return
+                try:
+                    yield item, render_derivatives(path(item)), None
+                except Exception as e:
+                    yield item, None, e
+            return
+
+        pending = {}
+        exhausted = broken = False
+        while True:
+            while not (exhausted or broken or self.cancelled.is_set()):
+                if len(pending) >= self.max_pending:
+                    break
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                future = self.pool.submit(render_derivatives, path(item))
+                pending[future] = item
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    # A worker died (e.g. killed for using too much
+                    # memory): report what was in flight, then give up
+                    broken = True
+                yield item, None if error else future.result(), error
+        if broken:
+            raise BrokenProcessPool("A photo processing worker died.")
+
+    def process(self, photos):
+        """Build the derivatives of each of photos, yielding (photo,
+        error) as each is saved; error is None or the exception raised."""
+        from .images import save_derivatives
+
+        for photo, rendered, error in self.render(photos):
+            if error is None:
+                try:
+                    save_derivatives(photo, rendered)
+                except Exception as e:
+                    error = e
+            yield photo, error
@@ -0,0 +1,232 @@
+"""Streaming exports of the list views' tables.
+
+Each writer takes the column labels, an iterator of rows (lists of
+plain Python values) and the model field each column comes from, and
+yields the file a piece at a time, so a StreamingHttpResponse can send
+it as the rows are read: memory use depends on the batch size, not the
+size of the table.
+
+CSV and XLSX need only the standard library (an .xlsx file is a zip of
+XML parts, written here as a stream). Parquet needs pyarrow, and is only
+offered if it is installed.
+
+"""
+
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class StreamBuffer:
+    """A write-only file that hands back what was written since the
+    last drain(). Being unseekable, zipfile writes to it as a stream."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    @property
+    def closed(self):
+        return False
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def as_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+# ====== CSV ======
+
+
+def csv_stream(header, rows, batch_size, fields=None):
+    buffer = StreamBuffer()
+    # The byte order mark tells Excel the file is UTF-8
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for batch in batched(rows, batch_size):
+        writer.writerows([as_text(value) for value in row] for row in batch)
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+# ====== XLSX ======
+
+XLSX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+XLSX_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+XLSX_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+XLSX_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+XLSX_SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+XLSX_SHEET_END = "</sheetData></worksheet>"
+
+# Control characters aren't allowed in XML 1.0
+XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+        text = escape(XML_ILLEGAL_RE.sub("", as_text(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    return f"<c><v>{value}</v></c>"
+
+
+def xlsx_row(values):
+    return "<row>" + "".join(xlsx_cell(value) for value in values) + "</row>"
+
+
+def xlsx_stream(header, rows, batch_size, fields=None):
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as xlsx:
+        xlsx.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        xlsx.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        xlsx.writestr("xl/workbook.xml", XLSX_WORKBOOK)
+        xlsx.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        with xlsx.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((XLSX_SHEET_START + xlsx_row(header)).encode())
+            for batch in batched(rows, batch_size):
+                sheet.write("".join(xlsx_row(row) for row in batch).encode())
+                yield buffer.drain()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.drain()
+
+
+# ====== Parquet ======
+
+
+INTEGER_FIELDS = {
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "IntegerField",
+    "PositiveBigIntegerField",
+    "PositiveIntegerField",
+    "PositiveSmallIntegerField",
+    "SmallAutoField",
+    "SmallIntegerField",
+}
+
+
+def parquet_type(field):
+    """The Arrow type of a column of field's values. Every Arrow column
+    may hold nulls. Other fields (foreign keys, UUIDs, ...) and columns
+    that aren't a database field (field None) are exported as text."""
+    internal_type = field.get_internal_type() if field is not None else None
+    if internal_type in INTEGER_FIELDS:
+        return pyarrow.int64()
+    if internal_type == "BooleanField":
+        return pyarrow.bool_()
+    if internal_type == "FloatField":
+        return pyarrow.float64()
+    if internal_type == "DecimalField" and field.max_digits:
+        return pyarrow.decimal128(field.max_digits, field.decimal_places or 0)
+    if internal_type == "DateField":
+        return pyarrow.date32()
+    if internal_type == "DateTimeField":
+        return pyarrow.timestamp(
+            "us", tz=settings.TIME_ZONE if settings.USE_TZ else None
+        )
+    if internal_type == "TimeField":
+        return pyarrow.time64("us")
+    if internal_type == "DurationField":
+        return pyarrow.duration("us")
+    return pyarrow.string()
+
+
+def parquet_table(batch, schema):
+    arrays = []
+    for column, field in zip(zip(*batch), schema):
+        if pyarrow.types.is_string(field.type):
+            column = [None if value is None else as_text(value) for value in column]
+        arrays.append(pyarrow.array(column, type=field.type))
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def parquet_stream(header, rows, batch_size, fields=None):
+    # The schema comes from the fields, not the first batch, whose
+    # values may all be None
+    fields = fields or [None] * len(header)
+    schema = pyarrow.schema(
+        [(name, parquet_type(field)) for name, field in zip(header, fields)]
+    )
+    buffer = StreamBuffer()
+    writer = pyarrow.parquet.ParquetWriter(buffer, schema)
+    for batch in batched(rows, batch_size):
+        # One row group per batch
+        writer.write_table(parquet_table(batch, schema))
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
+
+
+# Format -> (writer, content type, file extension)
+EXPORT_FORMATS = {
+    "csv": (csv_stream, "text/csv; charset=utf-8", "csv"),
+    "xlsx": (
+        xlsx_stream,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+    "parquet": (parquet_stream, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available_export_formats():
+    return [name for name in EXPORT_FORMATS if name != "parquet" or pyarrow]
@@ -14,6 +14,7 @@ from crispy_forms.layout import (
     Div,
 )
 
+from .images import InvalidImage, check_image
 from .models import Equipment, Site, DOI, FieldNote, History, Photo
 
 
@@ -334,12 +335,58 @@ class PhotoUploadForm(forms.Form):
         print(files)
         if not files:
             raise forms.ValidationError("Please select at least one image file.")
+        # From the files' own bytes: content_type is whatever the
+        # browser claims
         for f in files:
-            if not f.content_type.startswith("image/"):
-                raise forms.ValidationError(f"'{f.name}' is not a valid image file.")
+            try:
+                check_image(f)
+            except InvalidImage as e:
+                raise forms.ValidationError(f"'{f.name}' {e}")
         return files
 
 
+class PhotoUploadStartForm(forms.Form):
+    """Metadata sent to start (or resume) a chunked upload of one file.
+    Whether it's an image is checked from the bytes themselves, as they
+    arrive (inventory/uploads.py), not from a type the client names."""
+
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+    taken_by = forms.CharField(required=False, max_length=100)
+    date_taken = forms.DateField(required=False)
+
+
+class PhotoFilterForm(forms.Form):
+    """Sorting and filtering of a site's photos in the Photo Library."""
+
+    SORT_CHOICES = [
+        ("visit", "By visit"),
+        ("taken", "Oldest first"),
+        ("-taken", "Newest first"),
+    ]
+
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+    taken_from = forms.DateField(required=False, label="Taken from")
+    taken_to = forms.DateField(required=False, label="to")
+    located = forms.BooleanField(required=False, label="With GPS position")
+    # south,west,north,east in decimal degrees
+    bbox = forms.CharField(required=False, label="Within (S,W,N,E)")
+
+    def clean_bbox(self):
+        bbox = self.cleaned_data["bbox"]
+        if not bbox:
+            return None
+        try:
+            south, west, north, east = (float(part) for part in bbox.split(","))
+        except ValueError:
+            raise forms.ValidationError(
+                "Give south,west,north,east in decimal degrees."
+            )
+        if south > north:
+            raise forms.ValidationError("South must be below north.")
+        return south, west, north, east
+
+
 class PhotoForm(forms.ModelForm):
     class Meta:
         model = Photo
@@ -466,6 +513,45 @@ class HistoryForm(forms.ModelForm):
         self.fields["note"].widget.attrs["rows"] = 1
 
 
+# Spreadsheet imports
+class SpreadsheetImportForm(forms.Form):
+    KIND_CHOICES = [
+        ("equipment", "Equipment"),
+        ("history", "Equipment history"),
+        ("fieldnotes", "Field notes"),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label="Import")
+    file = forms.FileField(
+        label="Spreadsheet",
+        help_text="A .csv or .xlsx file. The first row names the columns.",
+    )
+    dry_run = forms.BooleanField(
+        required=False, label="Only check the rows, don't save anything"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = "post"
+        self.helper.attrs = {"enctype": "multipart/form-data"}
+        self.helper.layout = Layout(
+            Row(
+                Column("kind", css_class="col-md-3"),
+                Column("file", css_class="col-md-6"),
+                css_class="mb-1",
+            ),
+            Field("dry_run"),
+            Submit("submit", "Import", css_class="btn btn-primary"),
+        )
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError(f"'{file.name}' is not a .csv or .xlsx file.")
+        return file
+
+
 # Formsets
 class BaseStrictFormSet(BaseInlineFormSet):
     def clean(self):
@@ -0,0 +1,337 @@
+"""Image processing for Photo uploads.
+
+build_derivatives() makes the smaller display copies (thumbnail,
+medium, ...) of a photo in each configured format, and records their
+dimensions so templates can offer them to the browser in a srcset.
+The decoding and encoding (render_derivatives()) is kept apart from the
+saving (save_derivatives()), so that inventory/engine.py can run it in
+other processes.
+
+check_image() checks that an upload is an image worth storing, from
+its first bytes and header alone, before anything is decoded.
+
+It also reads the original's EXIF tags into the Photo (exif_fields()):
+capture time, GPS position, camera and orientation, so that galleries
+can sort and filter on them without opening files. Photos stored before
+that are filled in by `manage.py read_photo_exif`.
+
+"""
+
+import datetime
+import io
+import math
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils.timezone import get_current_timezone, make_aware
+from PIL import ExifTags, Image, ImageOps, features
+
+from .models import PhotoDerivative
+
+# Derivative format -> (Pillow format name, MIME type, file extension)
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "avif": ("AVIF", "image/avif", "avif"),
+}
+
+
+def available_formats():
+    """The configured derivative formats this Pillow build can write."""
+    return [
+        fmt
+        for fmt in settings.PHOTO_DERIVATIVE_FORMATS
+        if fmt == "jpeg" or features.check(fmt)
+    ]
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
+
+
+# ====== Upload checks ======
+
+# Larger images are refused by check_image(), and by Pillow itself when
+# derivatives are built
+Image.MAX_IMAGE_PIXELS = settings.PHOTO_UPLOAD_MAX_PIXELS
+
+
+class InvalidImage(ValueError):
+    """An upload isn't an image that can be accepted."""
+
+
+def sniff_format(header):
+    """The Pillow format name of a file from its first bytes (at least
+    12), or None."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    if header[:4] in (b"II*\x00", b"MM\x00*"):
+        return "TIFF"
+    return None
+
+
+def check_format(header):
+    """The format of a file from its first bytes, if it's one of
+    settings.PHOTO_UPLOAD_FORMATS; otherwise raise InvalidImage."""
+    fmt = sniff_format(header)
+    if fmt not in settings.PHOTO_UPLOAD_FORMATS:
+        raise InvalidImage(f"isn't a {', '.join(settings.PHOTO_UPLOAD_FORMATS)} image.")
+    return fmt
+
+
+def webp_size(header):
+    """(width, height) from the first 30 bytes of a WebP file, or None.
+    (Pillow reads a whole WebP file to open it.)"""
+    chunk = header[12:16]
+    if chunk == b"VP8X" and len(header) >= 30:
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+    elif chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+        width = int.from_bytes(header[26:28], "little") & 0x3FFF
+        height = int.from_bytes(header[28:30], "little") & 0x3FFF
+    elif chunk == b"VP8L" and header[20:21] == b"\x2f":
+        bits = int.from_bytes(header[21:25], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    else:
+        return None
+    return width, height
+
+
+class HeaderReader:
+    """Read-only file wrapper that refuses to read more than limit bytes
+    in all, so a malformed header can't make Pillow read a whole file."""
+
+    def __init__(self, file, limit):
+        self.file = file
+        self.limit = limit
+        self.count = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit - self.count + 1
+        data = self.file.read(size)
+        self.count += len(data)
+        if self.count > self.limit:
+            raise InvalidImage(
+                f"has no image header in its first {self.limit // 1024}KB."
+            )
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+
+def open_header(file, fmt):
+    """(width, height) of file, an fmt image, from Pillow reading only
+    its header."""
+    file.seek(0)
+    reader = HeaderReader(file, settings.PHOTO_UPLOAD_HEADER_BYTES)
+    try:
+        # Lazy: nothing is decoded. Only fmt's parser is tried.
+        with Image.open(reader, formats=[fmt]) as image:
+            return image.size
+    except InvalidImage:
+        raise
+    except Image.DecompressionBombError:
+        raise InvalidImage("has too many pixels.")
+    except (OSError, SyntaxError, EOFError, ValueError):
+        raise InvalidImage(f"isn't a valid {fmt} image.")
+
+
+def check_image(file):
+    """Check that file (an uploaded or opened binary file) is an image
+    in one of settings.PHOTO_UPLOAD_FORMATS, of at most
+    PHOTO_UPLOAD_MAX_PIXELS, reading only its magic bytes and header.
+
+    Returns (format, width, height); raises InvalidImage with a reason
+    to follow the file's name. Leaves file at its start.
+    """
+    file.seek(0)
+    try:
+        header = file.read(32)
+        fmt = check_format(header)
+        if fmt == "WEBP":
+            size = webp_size(header)
+            if size is None:
+                raise InvalidImage("isn't a valid WEBP image.")
+            width, height = size
+        else:
+            width, height = open_header(file, fmt)
+        if not width or not height:
+            raise InvalidImage("has no pixels.")
+        if width * height > settings.PHOTO_UPLOAD_MAX_PIXELS:
+            raise InvalidImage(
+                f"is too large ({width}x{height} pixels, at most "
+                f"{settings.PHOTO_UPLOAD_MAX_PIXELS // 1_000_000} megapixels)."
+            )
+        return fmt, width, height
+    finally:
+        file.seek(0)
+
+
+# ====== EXIF ======
+
+# Fields of Photo filled in from EXIF tags
+EXIF_FIELDS = ["taken_at", "latitude", "longitude", "camera", "orientation"]
+
+
+def exif_time(value, offset):
+    """The datetime of an EXIF "YYYY:MM:DD HH:MM:SS" value, or None.
+    Cameras record local time, with its UTC offset only sometimes; when
+    it's missing the time is taken to be in settings.TIME_ZONE."""
+    try:
+        taken = datetime.datetime.strptime(str(value).strip(), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        # Unset clocks write "0000:00:00 00:00:00"
+        return None
+    try:
+        tz = datetime.datetime.strptime(str(offset).strip(), "%z").tzinfo
+    except ValueError:
+        return make_aware(taken, get_current_timezone())
+    return taken.replace(tzinfo=tz)
+
+
+def exif_coordinate(value, ref, limit):
+    """Decimal degrees from EXIF (degrees, minutes, seconds) and an
+    N/S or E/W ref, or None."""
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if not math.isfinite(coordinate) or coordinate > limit:
+        return None
+    return -coordinate if ref in ("S", "W") else coordinate
+
+
+def exif_fields(exif):
+    """The Photo EXIF_FIELDS values found in exif (an Image.Exif)."""
+    tags = exif.get_ifd(ExifTags.IFD.Exif)
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    taken_at = exif_time(
+        tags.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime),
+        tags.get(ExifTags.Base.OffsetTimeOriginal),
+    )
+    latitude = exif_coordinate(
+        gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef), 90
+    )
+    longitude = exif_coordinate(
+        gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef), 180
+    )
+    if latitude is None or longitude is None:
+        latitude = longitude = None
+    make = str(exif.get(ExifTags.Base.Make, "")).strip(" \0")
+    model = str(exif.get(ExifTags.Base.Model, "")).strip(" \0")
+    # Most models already start with the make ("Canon EOS R6")
+    camera = model if model.lower().startswith(make.lower()) else f"{make} {model}"
+    orientation = exif.get(ExifTags.Base.Orientation)
+    return {
+        "taken_at": taken_at,
+        "latitude": latitude,
+        "longitude": longitude,
+        "camera": camera.strip()[:100],
+        "orientation": orientation if orientation in range(1, 9) else None,
+    }
+
+
+def read_exif(photo):
+    """Fill in photo's EXIF fields from its original, reading only the
+    file's header. Doesn't save photo."""
+    with photo.photo.open("rb") as f:
+        exif = Image.open(f).getexif()
+    for name, value in exif_fields(exif).items():
+        setattr(photo, name, value)
+    photo.exif_read = True
+
+
+def encode(image, fmt):
+    """Return image encoded in fmt as bytes."""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt][0], quality=settings.PHOTO_DERIVATIVE_QUALITY)
+    return buffer.getvalue()
+
+
+def delete_derivatives(photo):
+    # The post_delete receiver deletes the files
+    photo.derivatives.all().delete()
+
+
+def render_derivatives(original):
+    """The CPU-bound part of build_derivatives(): decode original (a
+    path or binary file), rotate it upright according to its EXIF
+    orientation tag, and resize and encode each derivative.
+
+    Makes no queries and writes nothing, so that it can run in a worker
+    process (inventory/engine.py). Returns (width, height, EXIF fields,
+    [(kind, format, width, height, encoded bytes), ...]).
+    """
+    with Image.open(original) as image:
+        # Read before rotating, which drops the orientation tag
+        fields = exif_fields(image.getexif())
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    encoded = []
+    for kind, max_side in settings.PHOTO_DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        # thumbnail() keeps the aspect ratio and never enlarges
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        for fmt in available_formats():
+            encoded.append(
+                (kind, fmt, resized.width, resized.height, encode(resized, fmt))
+            )
+    return image.width, image.height, fields, encoded
+
+
+def save_derivatives(photo, rendered):
+    """Store what render_derivatives() made of photo's original,
+    replacing any earlier derivatives, and fill in photo.width,
+    photo.height and the EXIF fields. Returns the list of
+    PhotoDerivative objects created."""
+    photo.width, photo.height, fields, encoded = rendered
+    for name, value in fields.items():
+        setattr(photo, name, value)
+    photo.exif_read = True
+    photo.save(
+        update_fields=["width", "height", *EXIF_FIELDS, "exif_read", "updated_at"]
+    )
+
+    delete_derivatives(photo)
+    stem = os.path.splitext(os.path.basename(photo.photo.name))[0]
+    token = uuid.uuid4().hex[:8]
+    derivatives = []
+    for kind, fmt, width, height, data in encoded:
+        derivative = PhotoDerivative(
+            photo=photo, kind=kind, format=fmt, width=width, height=height
+        )
+        # A new name on every build, so media can be cached forever
+        derivative.file.save(
+            f"{stem}_{kind}_{token}.{FORMATS[fmt][2]}",
+            ContentFile(data),
+            save=False,
+        )
+        derivatives.append(derivative)
+    PhotoDerivative.objects.bulk_create(derivatives)
+    return derivatives
+
+
+def build_derivatives(photo):
+    """(Re)build all display derivatives of photo, in this process.
+
+    Also fills in photo.width and photo.height, and the EXIF fields.
+    Returns the list of PhotoDerivative objects created.
+    """
+    with photo.photo.open("rb") as f:
+        rendered = render_derivatives(f)
+    return save_derivatives(photo, rendered)
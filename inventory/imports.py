@@ -0,0 +1,401 @@
+"""Bulk import of equipment, equipment history and field notes from
+CSV or XLSX spreadsheets.
+
+The first row names the columns, by field name or label ("Serial
+number", "date_purchased", ...). Every row is validated by the same
+form the edit pages use, except that sites are given by code and
+history entries name their equipment by serial number; both are
+resolved from dictionaries built once per import rather than a query
+per row. Valid rows are saved with bulk_create, one transaction per
+IMPORT_BATCH_SIZE rows; invalid ones are skipped and reported with
+their row number.
+
+bulk_create sends no signals, so each batch updates, in its own
+transaction, what the receivers in inventory/signals.py would have: the
+counters of the parents that got new rows and the search documents of
+the new rows (or of the equipment new history belongs to). List cache
+versions are bumped once, at the end. Nothing else is rebuilt, so the
+rest of the index keeps answering searches during an import.
+
+"""
+
+import csv
+import datetime
+import io
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+
+from django import forms
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .cache import bump_version
+from .counters import count_created
+from .forms import EquipmentForm, FieldNoteForm, HistoryForm
+from .models import Equipment, FieldNote, History, Site
+from .search import DOCUMENT_BUILDERS, index_objects
+
+# Day 0 of Excel's date serial numbers (as corrected for its 1900 leap
+# year bug), and the serial number of 9999-12-31
+EXCEL_EPOCH = datetime.date(1899, 12, 30)
+EXCEL_MAX_DATE = 2958465
+
+# ====== Reading spreadsheets ======
+
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def column_index(reference):
+    """0 for cell reference "A7", 27 for "AB7", ..."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def open_part(xlsx, name):
+    try:
+        return xlsx.open(name)
+    except KeyError:
+        raise ValueError(f"Not a complete .xlsx file: {name} is missing.")
+
+
+def first_sheet_path(xlsx):
+    with open_part(xlsx, "xl/workbook.xml") as part:
+        workbook = ET.parse(part).getroot()
+    sheet = workbook.find(f"{XLSX_NS}sheets/{XLSX_NS}sheet")
+    if sheet is None:
+        raise ValueError("The workbook has no worksheets.")
+    with open_part(xlsx, "xl/_rels/workbook.xml.rels") as part:
+        rels = ET.parse(part).getroot()
+    for rel in rels.iter(f"{XLSX_PKG_REL_NS}Relationship"):
+        if rel.get("Id") == sheet.get(f"{XLSX_REL_NS}id"):
+            target = rel.get("Target") or ""
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    return "xl/worksheets/sheet1.xml"
+
+
+def xlsx_rows(file):
+    """Yield the first worksheet of an .xlsx file as lists of strings,
+    parsing it incrementally. A damaged file raises ValueError, as a
+    CSV file that can't be read does."""
+    try:
+        with zipfile.ZipFile(file) as xlsx:
+            yield from worksheet_rows(xlsx)
+    except (zipfile.BadZipFile, zlib.error, EOFError, ET.ParseError) as e:
+        raise ValueError(f"Not a valid .xlsx file ({e}).")
+
+
+def worksheet_rows(xlsx):
+    shared = []
+    if "xl/sharedStrings.xml" in xlsx.namelist():
+        with xlsx.open("xl/sharedStrings.xml") as strings:
+            for _, element in ET.iterparse(strings):
+                if element.tag == f"{XLSX_NS}si":
+                    shared.append(
+                        "".join(t.text or "" for t in element.iter(f"{XLSX_NS}t"))
+                    )
+                    element.clear()
+    with open_part(xlsx, first_sheet_path(xlsx)) as sheet:
+        for _, element in ET.iterparse(sheet):
+            if element.tag != f"{XLSX_NS}row":
+                continue
+            values = []
+            for cell in element.iter(f"{XLSX_NS}c"):
+                reference = cell.get("r")
+                index = column_index(reference) if reference else len(values)
+                if index < 0:
+                    raise ValueError(f"Bad cell reference {reference!r}.")
+                values.extend([""] * (index - len(values) + 1))
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    text = "".join(t.text or "" for t in cell.iter(f"{XLSX_NS}t"))
+                else:
+                    value = cell.find(f"{XLSX_NS}v")
+                    text = value.text or "" if value is not None else ""
+                    if kind == "s" and text:
+                        text = shared_string(shared, text)
+                values[index] = text
+            element.clear()
+            yield values
+
+
+def shared_string(shared, text):
+    try:
+        return shared[int(text)]
+    except (IndexError, ValueError):
+        raise ValueError(f"Shared string {text!r} does not exist.")
+
+
+def csv_rows(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def read_rows(file, filename):
+    """Yield (row number, {column: value}) for each data row of a CSV
+    or XLSX file."""
+    if filename.lower().endswith(".xlsx"):
+        rows = xlsx_rows(file)
+    elif filename.lower().endswith(".csv"):
+        rows = csv_rows(file)
+    else:
+        raise ValueError(f"Can't import {filename}: only .csv and .xlsx are supported.")
+    header = [column_key(name) for name in next(rows, [])]
+    for number, values in enumerate(rows, start=2):
+        if any(value.strip() for value in values):
+            yield number, dict(zip(header, (value.strip() for value in values)))
+
+
+def column_key(name):
+    return name.strip().lower().replace(" ", "_")
+
+
+# ====== Validating and saving ======
+
+
+class LookupField(forms.Field):
+    """Resolves a value through a dictionary of lower-cased keys instead
+    of the database. Keys mapped to None are ambiguous."""
+
+    def __init__(self, lookup, description, **kwargs):
+        super().__init__(**kwargs)
+        self.lookup = lookup
+        self.description = description
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        key = str(value).strip().lower()
+        if key not in self.lookup:
+            raise forms.ValidationError(f"No {self.description} {value!r}.")
+        if self.lookup[key] is None:
+            raise forms.ValidationError(f"More than one {self.description} {value!r}.")
+        return self.lookup[key]
+
+
+def unique_lookup(pairs):
+    """{key.lower(): value}, with keys that occur more than once mapped
+    to None."""
+    lookup = {}
+    for key, value in pairs:
+        key = key.strip().lower()
+        lookup[key] = None if key in lookup else value
+    return lookup
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        # (row number, ["field: message", ...])
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+class Importer:
+    """Validates rows with form_class and bulk-creates model instances.
+
+    get_lookup_fields() maps form field names to the LookupFields that
+    replace them; aliases maps other column names to form field names.
+    """
+
+    model = None
+    form_class = None
+    aliases = {}
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+
+    def get_lookup_fields(self):
+        return {}
+
+    def make_form_class(self):
+        lookup_fields = self.get_lookup_fields()
+
+        class RowForm(self.form_class):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name, field in lookup_fields.items():
+                    if name in self.fields:
+                        field.required = self.fields[name].required
+                    self.fields[name] = field
+
+            def _get_validation_exclusions(self):
+                # The lookups already checked these exist; don't let
+                # model validation query for each row again.
+                return super()._get_validation_exclusions() | set(lookup_fields)
+
+        return RowForm
+
+    def row_data(self, row, date_fields):
+        data = {}
+        for column, value in row.items():
+            data[self.aliases.get(column, column)] = value
+        for name in date_fields:
+            value = data.get(name, "")
+            # Dates in .xlsx files are day counts
+            if value.replace(".", "", 1).isdigit() and float(value) <= EXCEL_MAX_DATE:
+                data[name] = EXCEL_EPOCH + datetime.timedelta(days=float(value))
+        return data
+
+    def bind(self, form, data):
+        """Point form at another row. Building the form anew for each
+        row (deep copies of its fields, the crispy layout) would take
+        most of the time of an import."""
+        form.data = data
+        form.instance = self.model()
+        form._errors = None
+        form._bound_fields_cache = {}
+        return form
+
+    def build(self, form):
+        return form.save(commit=False)
+
+    def save_batch(self, batch):
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                created = self.model.objects.bulk_create(batch)
+            else:
+                # MySQL doesn't return the pks of bulk inserted rows: the
+                # batch is the rows after the last one before it
+                last_pk = self.model.objects.aggregate(last=Max("pk"))["last"]
+                self.model.objects.bulk_create(batch)
+                created = self.model.objects.filter(pk__gt=last_pk or 0)
+            # What post_save receivers do for each row
+            count_created(batch)
+            self.index(created)
+
+    def index(self, created):
+        if self.model in DOCUMENT_BUILDERS:
+            index_objects(self.model, [instance.pk for instance in created])
+
+    def finish(self):
+        """Bump the versions of the cached lists the new rows appear in."""
+        for model in (self.model, Site, Equipment):
+            bump_version(model)
+
+    def run(self, rows, dry_run=False):
+        """Import rows as yielded by read_rows(). Returns an
+        ImportResult."""
+        result = ImportResult()
+        start = time.perf_counter()
+        form_class = self.make_form_class()
+        date_fields = [
+            name
+            for name, field in form_class.base_fields.items()
+            if isinstance(field, forms.DateField)
+        ]
+        form = form_class(data={})
+        batch = []
+        try:
+            for number, row in rows:
+                result.rows += 1
+                self.bind(form, self.row_data(row, date_fields))
+                if not form.is_valid():
+                    result.errors.append(
+                        (
+                            number,
+                            [
+                                f"{name}: {message}" if name != "__all__" else message
+                                for name, messages in form.errors.items()
+                                for message in messages
+                            ],
+                        )
+                    )
+                    continue
+                batch.append(self.build(form))
+                if len(batch) >= self.batch_size:
+                    if not dry_run:
+                        self.save_batch(batch)
+                    result.created += len(batch)
+                    batch = []
+            if batch and not dry_run:
+                self.save_batch(batch)
+            result.created += len(batch)
+        finally:
+            if result.created and not dry_run:
+                self.finish()
+            result.seconds = time.perf_counter() - start
+        return result
+
+
+class EquipmentImporter(Importer):
+    model = Equipment
+    form_class = EquipmentForm
+    # The equipment list's column names, so its exports import again
+    aliases = {"location": "site"}
+
+    def get_lookup_fields(self):
+        sites = unique_lookup(Site.objects.values_list("code", "pk"))
+        return {"site": LookupField(site_instances(sites), "site with code")}
+
+
+class FieldNoteImporter(Importer):
+    model = FieldNote
+    form_class = FieldNoteForm
+    aliases = {"date": "date_visited", "visitors": "site_visitors"}
+
+    def get_lookup_fields(self):
+        sites = unique_lookup(Site.objects.values_list("code", "pk"))
+        return {"site": LookupField(site_instances(sites), "site with code")}
+
+
+class HistoryImporter(Importer):
+    """History entries name their equipment by serial number."""
+
+    model = History
+    form_class = HistoryForm
+    aliases = {"equipment": "serial_number", "item": "serial_number"}
+
+    def get_lookup_fields(self):
+        equipment = unique_lookup(
+            Equipment.objects.exclude(serial_number="").values_list(
+                "serial_number", "pk"
+            )
+        )
+        return {
+            "serial_number": LookupField(
+                equipment, "equipment with serial number", required=True
+            )
+        }
+
+    def build(self, form):
+        history = form.save(commit=False)
+        history.item_id = form.cleaned_data["serial_number"]
+        return history
+
+    def index(self, created):
+        # History notes are part of their equipment's document
+        index_objects(Equipment, {history.item_id for history in created})
+
+
+def site_instances(sites):
+    """Replace the pks in a unique_lookup() of sites with unsaved Site
+    stand-ins, which is all a ForeignKey assignment needs."""
+    return {code: Site(pk=pk) if pk is not None else None for code, pk in sites.items()}
+
+
+IMPORTERS = {
+    "equipment": EquipmentImporter,
+    "history": HistoryImporter,
+    "fieldnotes": FieldNoteImporter,
+}
+
+
+def import_file(kind, file, filename, dry_run=False):
+    return IMPORTERS[kind]().run(read_rows(file, filename), dry_run=dry_run)
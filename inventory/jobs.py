@@ -0,0 +1,187 @@
+"""A small database-backed job queue for post-upload photo processing.
+
+Upload views call enqueue() and return straight away. The
+run_photo_jobs management command claims due PhotoJob rows and runs
+them, so no broker is needed: the PhotoJob table is the queue.
+
+Jobs are claimed with a conditional UPDATE, so several workers can
+share the table on any database backend. A job that raises is retried
+with exponential backoff until PHOTO_JOB_MAX_ATTEMPTS is reached, then
+left FAILED until someone runs `run_photo_jobs --retry-failed`.
+
+process_photo jobs are CPU-bound, so work() hands them to a pool of
+worker processes (inventory/engine.py) and records each outcome as it
+comes back; other tasks run in the worker itself.
+
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.timezone import now
+
+from .engine import PhotoProcessor
+from .images import build_derivatives
+from .models import PhotoJob
+
+logger = logging.getLogger("inventory")
+
+# Task name -> callable taking a Photo
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a queue task."""
+
+    def decorator(func):
+        TASKS[name] = func
+        return func
+
+    return decorator
+
+
+@task("process_photo")
+def process_photo(photo):
+    build_derivatives(photo)
+
+
+def enqueue(photos, task_name="process_photo"):
+    """Queue task_name for each photo, replacing any earlier job for
+    the same photo and task."""
+    photos = list(photos)
+    PhotoJob.objects.filter(photo__in=photos, task=task_name).delete()
+    return PhotoJob.objects.bulk_create(
+        [PhotoJob(photo=photo, task=task_name) for photo in photos]
+    )
+
+
+def requeue_stale():
+    """Put jobs claimed by a worker that died back in the queue."""
+    cutoff = now() - timedelta(seconds=settings.PHOTO_JOB_STALE_AFTER)
+    return PhotoJob.objects.filter(
+        status=PhotoJob.RUNNING, locked_at__lt=cutoff
+    ).update(status=PhotoJob.PENDING, locked_at=None)
+
+
+def retry_failed():
+    """Give all FAILED jobs a fresh set of attempts."""
+    return PhotoJob.objects.filter(status=PhotoJob.FAILED).update(
+        status=PhotoJob.PENDING, attempts=0, run_after=now()
+    )
+
+
+def claim_next():
+    """Claim the next due job and return it, or None if nothing is due."""
+    while True:
+        job_id = (
+            PhotoJob.objects.filter(status=PhotoJob.PENDING, run_after__lte=now())
+            .order_by("run_after", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        # Only one worker's UPDATE can match status=PENDING
+        claimed = PhotoJob.objects.filter(pk=job_id, status=PhotoJob.PENDING).update(
+            status=PhotoJob.RUNNING, locked_at=now(), attempts=F("attempts") + 1
+        )
+        if claimed:
+            job = (
+                PhotoJob.objects.select_related("photo__fieldnote")
+                .filter(pk=job_id)
+                .first()
+            )
+            # None if the photo was deleted in the meantime
+            if job is not None:
+                return job
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome."""
+    try:
+        TASKS[job.task](job.photo)
+    except Exception as e:
+        return finish_job(job, e)
+    return finish_job(job)
+
+
+def finish_job(job, error=None):
+    """Record the outcome of a claimed job: done, or error (the
+    exception it raised) and a retry later unless it has used up its
+    attempts."""
+    if error is not None:
+        job.last_error = f"{type(error).__name__}: {error}"
+        if job.attempts >= settings.PHOTO_JOB_MAX_ATTEMPTS:
+            job.status = PhotoJob.FAILED
+            logger.error(
+                "Photo job %s for photo %s gave up after %s attempts: %s",
+                job.task,
+                job.photo_id,
+                job.attempts,
+                job.last_error,
+                extra={"action": job.task, "model": "photo", "pk": job.photo_id},
+            )
+        else:
+            job.status = PhotoJob.PENDING
+            delay = settings.PHOTO_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.run_after = now() + timedelta(seconds=delay)
+            logger.warning(
+                "Photo job %s for photo %s failed (attempt %s), retrying in %ss: %s",
+                job.task,
+                job.photo_id,
+                job.attempts,
+                delay,
+                job.last_error,
+                extra={"action": job.task, "model": "photo", "pk": job.photo_id},
+            )
+    else:
+        job.status = PhotoJob.DONE
+        job.last_error = ""
+    job.locked_at = None
+    # A queryset update, as the photo (and so the job) may have been
+    # deleted while the task ran
+    PhotoJob.objects.filter(pk=job.pk).update(
+        status=job.status,
+        last_error=job.last_error,
+        run_after=job.run_after,
+        locked_at=None,
+    )
+    return job
+
+
+def work(burst=False, poll_interval=None, workers=None):
+    """Process jobs until interrupted, or until the queue is empty if
+    burst is True. process_photo jobs run in worker processes, see
+    PhotoProcessor. Returns the number of jobs run."""
+    if poll_interval is None:
+        poll_interval = settings.PHOTO_JOB_POLL_INTERVAL
+    count = 0
+
+    def claimed_photos():
+        # Claimed one at a time, as the processor has room for them
+        nonlocal count
+        while (job := claim_next()) is not None:
+            if job.task == "process_photo":
+                job.photo.job = job
+                yield job.photo
+            else:
+                run_job(job)
+                count += 1
+
+    requeue_stale()
+    with PhotoProcessor(workers) as processor:
+        while not processor.cancelled.is_set():
+            ran = count
+            for photo, error in processor.process(claimed_photos()):
+                finish_job(photo.job, error)
+                count += 1
+            if count > ran:
+                continue
+            if burst:
+                break
+            time.sleep(poll_interval)
+            requeue_stale()
+    return count
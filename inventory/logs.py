@@ -0,0 +1,166 @@
+"""Logging: JSON lines, written by a background thread.
+
+The loggers in settings.LOGGING send records to QueueListenerHandlers,
+which only put them on a queue. A QueueListener thread per handler
+takes them off and passes them to the console and file handlers, so a
+request never waits for the disk. If the queue fills up (the disk has
+stalled), records are dropped rather than held up.
+
+The file gets a JSON object per line (JsonFormatter): time, level,
+logger and message, plus whatever was passed in extra=. Actions on
+data are logged by log_action() with user, action, model and pk
+fields, e.g.
+
+    {"time": "...", "level": "INFO", "logger": "inventory",
+     "message": "hank updated fieldnote 12", "user": "hank",
+     "action": "updated", "model": "fieldnote", "pk": 12, "site": 3}
+
+Log calls pass their values as arguments rather than formatting them
+in an f-string, so a record that is filtered out costs next to
+nothing; log_action() doesn't even build its fields then.
+
+Each handler counts the records it passes on, by logger and level, and
+logs the counts (and any dropped records) to "inventory.logs" every
+volume_interval seconds. `manage.py log_volume` tallies the log file.
+
+The listener threads start when logging is configured, so a server
+that forks after loading Django (gunicorn --preload) needs them
+restarted in each worker.
+
+"""
+
+import copy
+import json
+import logging
+import queue
+import time
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+
+from django.db import models
+
+logger = logging.getLogger("inventory")
+
+# Attributes every LogRecord has; anything else came from extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # On stopping, wait for room in a full queue rather than fail
+        self.queue.put(self._sentinel)
+
+
+class QueueListenerHandler(QueueHandler):
+    """Queues records for a QueueListener thread that passes them to
+    handlers.
+
+    In settings.LOGGING, give handlers as "cfg://handlers.<name>"
+    references, and name this handler so that it sorts after them:
+    dictConfig configures handlers in name order.
+    """
+
+    def __init__(self, handlers, maxsize=10000, volume_interval=3600):
+        super().__init__(queue.Queue(maxsize))
+        # Indexing resolves the cfg:// references
+        handlers = [handlers[i] for i in range(len(handlers))]
+        self.listener = Listener(self.queue, *handlers, respect_handler_level=True)
+        self.volume = Counter()
+        self.dropped = 0
+        self.volume_interval = volume_interval
+        self.volume_since = time.monotonic()
+        self.listener.start()
+
+    def prepare(self, record):
+        # As QueueHandler.prepare(), but keeping the traceback apart
+        # from the message for JsonFormatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        # Called with the handler's lock held
+        self.volume[f"{record.name} {record.levelname}"] += 1
+        super().emit(record)
+        elapsed = time.monotonic() - self.volume_since
+        if self.volume_interval and elapsed >= self.volume_interval:
+            self.report_volume(elapsed)
+
+    def report_volume(self, elapsed):
+        total = sum(self.volume.values())
+        record = logging.makeLogRecord(
+            {
+                "name": "inventory.logs",
+                "levelno": logging.WARNING if self.dropped else logging.INFO,
+                "levelname": "WARNING" if self.dropped else "INFO",
+                "msg": "Logged %d records in %ds, dropped %d",
+                "args": (total, elapsed, self.dropped),
+                "records": dict(self.volume),
+                "dropped": self.dropped,
+                "queued": self.queue.qsize(),
+            }
+        )
+        self.volume = Counter()
+        self.dropped = 0
+        self.volume_since = time.monotonic()
+        self.enqueue(self.prepare(record))
+
+    def close(self):
+        # Write out what's queued before the handlers close
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def log_action(user, action, obj, **fields):
+    """Log that user did action ("created", "deleted", ...) to obj, a
+    model instance or class, with fields as extra structured data.
+
+    Give values that are already loaded (site_id rather than site):
+    logging shouldn't cost a query. Deleted instances have no pk; pass
+    it as pk=.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    fields = {
+        "user": str(user),
+        "action": action,
+        "model": obj._meta.model_name,
+        "pk": obj.pk if isinstance(obj, models.Model) else None,
+        **fields,
+    }
+    if fields["pk"] is None:
+        message = "%(user)s %(action)s %(model)s"
+    else:
+        message = "%(user)s %(action)s %(model)s %(pk)s"
+    logger.info(message, fields, extra=fields)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from inventory.models import Site
+
+
+def simulated_request(using):
+    """What a request does with its connection: Django calls
+    close_old_connections() as each request starts and finishes, which
+    closes the connection unless CONN_MAX_AGE allows keeping it."""
+    close_old_connections()
+    list(Site.objects.using(using).values_list("pk", flat=True)[:1])
+    close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time simulated requests with a new database connection for each "
+        "(CONN_MAX_AGE = 0) and with a persistent, health-checked "
+        "connection, to show the per-request cost of connecting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--database", default="default", help="Database alias to benchmark."
+        )
+
+    def time_requests(self, using, conn_max_age, health_checks, count):
+        settings_dict = connections[using].settings_dict
+        settings_dict["CONN_MAX_AGE"] = conn_max_age
+        settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+        simulated_request(using)  # Warm up
+        start = time.perf_counter()
+        for _ in range(count):
+            simulated_request(using)
+        return (time.perf_counter() - start) / count * 1000
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        connection = connections[using]
+        settings_dict = connection.settings_dict
+        saved = settings_dict["CONN_MAX_AGE"], settings_dict["CONN_HEALTH_CHECKS"]
+        count = options["requests"]
+        try:
+            connection.close()
+            new = self.time_requests(using, 0, False, count)
+            persistent = self.time_requests(using, 600, True, count)
+        finally:
+            settings_dict["CONN_MAX_AGE"], settings_dict["CONN_HEALTH_CHECKS"] = saved
+            connection.close()
+
+        self.stdout.write(
+            f"{connection.vendor} ({using}), {count} requests of one query:"
+        )
+        self.stdout.write(f"  new connection per request: {new:.3f}ms per request")
+        self.stdout.write(
+            f"  persistent connection:      {persistent:.3f}ms per request"
+        )
+        self.stdout.write(
+            f"  connection overhead:        {new - persistent:.3f}ms per request"
+        )
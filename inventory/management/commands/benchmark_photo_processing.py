@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from inventory.engine import PhotoProcessor, cpu_count
+
+
+def default_workers():
+    """0 (in this process), then 1, 2, 4, ... up to the CPU count."""
+    counts = [0, 1]
+    while counts[-1] * 2 < cpu_count():
+        counts.append(counts[-1] * 2)
+    if counts[-1] < cpu_count():
+        counts.append(cpu_count())
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how fast derivatives are built, in images per second, "
+        "with different numbers of worker processes, to choose "
+        "PHOTO_PROCESS_WORKERS. Generated JPEGs the size of a camera's "
+        "are resized and encoded as uploads are, without saving anything. "
+        "Starting the workers is not timed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=None,
+            help="Worker counts to try (default 0, then 1, 2, 4, ... up to "
+            "the CPU count). 0 processes the images in this process.",
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=24,
+            help="Images processed per run (default 24).",
+        )
+        parser.add_argument(
+            "--size",
+            default="4000x3000",
+            help="Width x height of the generated images (default 4000x3000).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            width, height = (int(n) for n in options["size"].split("x"))
+        except ValueError:
+            raise CommandError("--size must be WIDTHxHEIGHT, e.g. 4000x3000.")
+        counts = options["workers"] or default_workers()
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.make_images(directory, options["images"], width, height)
+            self.stdout.write(
+                f"{len(paths)} {width}x{height} images, {cpu_count()} CPUs."
+            )
+            baseline = None
+            for workers in counts:
+                result = self.run(workers, paths)
+                if result is None:
+                    self.stdout.write("Interrupted.")
+                    return
+                rate, failed = result
+                if failed:
+                    raise CommandError(f"{failed} images could not be processed.")
+                baseline = baseline or rate
+                speedup = rate / baseline
+                efficiency = f"{speedup / workers:.0%}" if workers else "-"
+                self.stdout.write(
+                    f"{workers:>3} workers: {rate:6.2f} images/s, "
+                    f"{speedup:.2f}x, efficiency {efficiency}"
+                )
+
+    def make_images(self, directory, count, width, height):
+        """Write count JPEGs of noise, which compresses and resizes about
+        as slowly as a photo; a few are made and copied."""
+        samples = []
+        for i in range(min(count, 4)):
+            path = os.path.join(directory, f"sample{i}.jpg")
+            image = Image.effect_noise((width, height), 48 + 16 * i).convert("RGB")
+            image.save(path, "JPEG", quality=90)
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, f"image{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(samples[i % len(samples)])
+            paths.append(path)
+        return paths
+
+    def run(self, workers, paths):
+        """Process paths with workers processes. Returns images per
+        second and the number that failed, or None if interrupted."""
+        done = failed = 0
+        with PhotoProcessor(workers) as processor:
+            # Start the workers and load Django in each
+            list(processor.render(paths[: processor.workers], path=str))
+            started = time.monotonic()
+            for _, _, error in processor.render(paths, path=str):
+                done += 1
+                failed += error is not None
+            elapsed = time.monotonic() - started
+            if processor.cancelled.is_set():
+                return None
+        return done / elapsed, failed
@@ -0,0 +1,171 @@
+import json
+import math
+import time
+import tracemalloc
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import NoReverseMatch
+from django.utils.timezone import now
+
+from inventory.models import Equipment, FieldNote, History, Photo, Site
+
+from .check_query_budgets import BUDGET_CHECKS
+from .check_query_budgets import Command as CheckQueryBudgetsCommand
+
+COUNTED_MODELS = (Site, FieldNote, Photo, Equipment, History)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+class Command(CheckQueryBudgetsCommand):
+    help = (
+        "Request the main pages (those check_query_budgets checks) "
+        "repeatedly and report p50/p95 latency, SQL queries and peak "
+        "Python memory for each. --output saves the results as JSON; "
+        "--baseline compares with saved results and fails on "
+        "regressions. Use generate_synthetic_data for data at scale."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--iterations", type=int, default=20, help="Timed requests per page."
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=2, help="Untimed requests per page first."
+        )
+        parser.add_argument(
+            "--cached",
+            action="store_true",
+            help="Leave the list cache on (the default measures uncached lists).",
+        )
+        parser.add_argument("--output", help="Save the results to this JSON file.")
+        parser.add_argument(
+            "--baseline", help="Compare with results saved earlier with --output."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Fraction by which p95 latency or memory may exceed the "
+            "baseline before it counts as a regression (default 0.2).",
+        )
+
+    def handle(self, *args, **options):
+        settings_overrides = {"ALLOWED_HOSTS": ["*"]}
+        if not options["cached"]:
+            settings_overrides["INVENTORY_LIST_CACHE_TIMEOUT"] = 0
+        with override_settings(**settings_overrides):
+            results = self.run_benchmarks(options)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}.")
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read baseline: {e}")
+            self.compare(results, baseline, options["tolerance"])
+
+    def run_benchmarks(self, options):
+        client = Client()
+        client.force_login(self.get_user(options["username"]))
+        pages = {}
+        for description, url in BUDGET_CHECKS:
+            try:
+                url = url()
+            except (NoReverseMatch, TypeError):
+                self.stdout.write(f"SKIPPED  {description}: no data")
+                continue
+            pages[description] = self.benchmark(client, url, options)
+            self.stdout.write(self.summary(description, pages[description]))
+        return {
+            "created": now().isoformat(),
+            "database": connection.vendor,
+            "cached": options["cached"],
+            "iterations": options["iterations"],
+            "rows": {
+                model._meta.model_name: model.objects.count()
+                for model in COUNTED_MODELS
+            },
+            "pages": pages,
+        }
+
+    def benchmark(self, client, url, options):
+        for _ in range(options["warmup"]):
+            client.get(url)
+        seconds = []
+        for _ in range(options["iterations"]):
+            start = time.perf_counter()
+            response = client.get(url)
+            seconds.append(time.perf_counter() - start)
+        # Memory on a request of its own, as tracing slows everything
+        tracemalloc.start()
+        try:
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            "url": url,
+            "status": response.status_code,
+            "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+            "p95_ms": round(percentile(seconds, 95) * 1000, 2),
+            "queries": response.wsgi_request.metrics.queries,
+            "peak_memory_kb": round(peak / 1024),
+        }
+
+    def summary(self, description, page):
+        return (
+            f"{description}: p50 {page['p50_ms']:.1f}ms, p95 {page['p95_ms']:.1f}ms, "
+            f"{page['queries']} queries, {page['peak_memory_kb']}KB peak "
+            f"({page['status']})"
+        )
+
+    def compare(self, results, baseline, tolerance):
+        self.stdout.write(f"Compared with the baseline of {baseline['created']}:")
+        if results["rows"] != baseline["rows"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"The data differs from the baseline's ({baseline['rows']}); "
+                    "the figures may not be comparable."
+                )
+            )
+        regressions = []
+        for description, page in results["pages"].items():
+            base = baseline["pages"].get(description)
+            if base is None:
+                self.stdout.write(f"NEW      {description}")
+                continue
+            problems = []
+            # Allow a millisecond of noise on the fastest pages
+            if page["p95_ms"] > base["p95_ms"] * (1 + tolerance) + 1:
+                problems.append("p95")
+            if page["queries"] > base["queries"]:
+                problems.append("queries")
+            if page["peak_memory_kb"] > base["peak_memory_kb"] * (1 + tolerance):
+                problems.append("memory")
+            line = (
+                f"{description}: p95 {base['p95_ms']:.1f} -> {page['p95_ms']:.1f}ms, "
+                f"queries {base['queries']} -> {page['queries']}, "
+                f"peak {base['peak_memory_kb']} -> {page['peak_memory_kb']}KB"
+            )
+            if problems:
+                regressions.append(description)
+                self.stdout.write(
+                    self.style.ERROR(f"WORSE    {line} ({', '.join(problems)})")
+                )
+            else:
+                self.stdout.write(f"OK       {line}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} pages regressed.")
@@ -0,0 +1,82 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.engine import PhotoProcessor
+from inventory.models import Photo
+
+logger = logging.getLogger("inventory")
+
+
+class Command(BaseCommand):
+    help = (
+        "Build thumbnail and medium display copies of uploaded photos, in "
+        "parallel worker processes. ^C stops after the photos being "
+        "processed; run again to carry on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild derivatives for every photo, not just those missing them.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes resizing photos in parallel (default "
+            "PHOTO_PROCESS_WORKERS, or one per CPU); 0 to resize them in "
+            "this process.",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=50,
+            help="Report progress after this many photos (default 50).",
+        )
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.select_related("fieldnote").order_by("pk")
+        if not options["all"]:
+            photos = photos.filter(derivatives__isnull=True)
+        total = photos.count()
+
+        built = failed = 0
+        started = time.monotonic()
+        with PhotoProcessor(options["workers"]) as processor:
+            self.stdout.write(
+                f"Processing {total} photos with {processor.workers} workers."
+            )
+            for photo, error in processor.process(photos.iterator(chunk_size=100)):
+                if error is None:
+                    built += 1
+                else:
+                    # Templates fall back to the original
+                    logger.warning(
+                        "Could not build derivatives for photo %s: %s",
+                        photo.pk,
+                        error,
+                        extra={"model": "photo", "pk": photo.pk},
+                    )
+                    failed += 1
+                done = built + failed
+                if done % options["progress_every"] == 0:
+                    self.write_progress(done, total, started)
+            cancelled = processor.cancelled.is_set()
+
+        if (built + failed) % options["progress_every"]:
+            self.write_progress(built + failed, total, started)
+        style = self.style.WARNING if cancelled else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"{'Interrupted: built' if cancelled else 'Built'} derivatives "
+                f"for {built} photos, {failed} failed."
+            )
+        )
+
+    def write_progress(self, done, total, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f"{done} of {total} photos, {rate:.1f} images/s.")
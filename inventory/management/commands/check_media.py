@@ -0,0 +1,189 @@
+import os
+import time
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import blobs
+from inventory.jobs import enqueue
+from inventory.models import Photo, PhotoBlob, PhotoDerivative, PhotoUpload
+from inventory.storage import BLOB_DIR
+
+# The directories under MEDIA_ROOT that hold the files of these tables
+MEDIA_DIRS = ("site_photos", BLOB_DIR, "uploads")
+# File names looked up in the database at a time
+BATCH_SIZE = 1000
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def referenced(names):
+    """The names, of a list of storage names, that some row uses."""
+    found = set()
+    for model, field in (
+        (Photo, "photo"),
+        (PhotoDerivative, "file"),
+        (PhotoBlob, "file"),
+        (PhotoUpload, "file"),
+    ):
+        found.update(
+            model.objects.filter(**{f"{field}__in": names}).values_list(
+                field, flat=True
+            )
+        )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the photo files in MEDIA_ROOT and the rows that use "
+        "them agree: list files no row uses (orphans) and rows whose "
+        "files are missing. Both the storage tree and the tables are "
+        "read a batch at a time. --delete removes orphans, blobs no "
+        "photo uses and derivative rows without files (queueing their "
+        "photos to be processed again); photos without files are only "
+        "listed. -v 2 lists every problem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete orphaned files and blobs, and derivative and "
+            "partial upload rows whose files are missing.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Only count files older than this many hours as orphans, "
+            "so that files being uploaded are left alone (default 24).",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.delete = options["delete"]
+        self.cutoff = time.time() - options["min_age"] * 3600
+        self.missing_photos = 0
+        problems = self.check_orphans() + self.check_missing()
+        if self.delete:
+            self.prune_directories()
+            # Only a person can replace a photo
+            problems = self.missing_photos
+        if problems:
+            raise CommandError(f"{problems} problems found.")
+        self.stdout.write(self.style.SUCCESS("Photo files and rows agree."))
+
+    def report(self, message):
+        if self.verbosity >= 2:
+            self.stdout.write(message)
+
+    def summary(self, count, message, fixed=True):
+        """Write the count of a kind of problem; fixed if --delete
+        deals with it."""
+        if count and fixed and self.delete:
+            message += ", deleted"
+        style = self.style.WARNING if count else (lambda text: text)
+        self.stdout.write(style(f"{count} {message}."))
+
+    # ====== Files without rows ======
+
+    def stored_files(self):
+        """Yield (name, size) of the files under MEDIA_DIRS that are
+        older than --min-age, a directory at a time."""
+        for top in MEDIA_DIRS:
+            for directory, _, files in os.walk(default_storage.path(top)):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    stat = os.stat(path)
+                    if stat.st_mtime < self.cutoff:
+                        name = os.path.relpath(path, default_storage.location)
+                        yield name.replace(os.sep, "/"), stat.st_size
+
+    def check_orphans(self):
+        count = size = 0
+        for batch in batches(self.stored_files(), BATCH_SIZE):
+            used = referenced([name for name, _ in batch])
+            for name, file_size in batch:
+                if name in used:
+                    continue
+                count += 1
+                size += file_size
+                self.report(f"Orphan: {name} ({file_size / 1024:.0f}KB)")
+                if self.delete:
+                    default_storage.delete(name)
+        self.summary(count, f"orphaned files ({size / 2**20:.1f}MB)")
+
+        # Blobs left behind by a collect() that never ran
+        unused = PhotoBlob.objects.filter(photos__isnull=True).values_list("pk", "file")
+        blob_count = 0
+        for pk, name in list(unused):
+            blob_count += 1
+            self.report(f"Unused blob: {name}")
+            if self.delete:
+                PhotoBlob.objects.filter(pk=pk).update(ref_count=0)
+                blobs.collect(pk)
+        self.summary(blob_count, "blobs no photo uses")
+        return count + blob_count
+
+    # ====== Rows without files ======
+
+    def missing(self, queryset, field):
+        """Yield the pk and file name of each row of queryset whose file
+        field names a file that doesn't exist."""
+        rows = queryset.order_by("pk").values_list("pk", field)
+        for pk, name in rows.iterator(chunk_size=BATCH_SIZE):
+            if name and not default_storage.exists(name):
+                yield pk, name
+
+    def check_missing(self):
+        for pk, name in self.missing(Photo.objects.all(), "photo"):
+            self.missing_photos += 1
+            self.report(f"Missing: photo {pk}: {name}")
+        self.summary(self.missing_photos, "photos whose files are missing", False)
+        problems = self.missing_photos
+
+        # Deleted after the loop, so as not to change the rows being read
+        derivatives = []
+        for pk, name in self.missing(PhotoDerivative.objects.all(), "file"):
+            derivatives.append(pk)
+            self.report(f"Missing: derivative {pk}: {name}")
+        if self.delete:
+            for batch in batches(derivatives, BATCH_SIZE):
+                rows = PhotoDerivative.objects.filter(pk__in=batch)
+                # Build them again
+                enqueue(Photo.objects.filter(derivatives__in=rows).distinct())
+                rows.delete()
+        self.summary(len(derivatives), "derivatives whose files are missing")
+        problems += len(derivatives)
+
+        partials = PhotoUpload.objects.filter(photo__isnull=True).exclude(
+            file__startswith=f"{BLOB_DIR}/"
+        )
+        uploads = []
+        for pk, name in self.missing(partials, "file"):
+            uploads.append(pk)
+            self.report(f"Missing: upload {pk}: {name}")
+        if self.delete:
+            # The client starts again
+            PhotoUpload.objects.filter(pk__in=uploads).delete()
+        self.summary(len(uploads), "unfinished uploads whose files are missing")
+        return problems + len(uploads)
+
+    def prune_directories(self):
+        """Remove empty directories, e.g. those of deleted sites."""
+        for top in MEDIA_DIRS:
+            root = default_storage.path(top)
+            for directory, _, _ in os.walk(root, topdown=False):
+                if directory == root:
+                    continue
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # Not empty
+                    pass
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import NoReverseMatch, reverse
+
+from inventory.models import Equipment, FieldNote, Photo, Site
+
+
+def busiest(model, related):
+    """The pk of the model instance with the most related rows, so that
+    a page whose query count grows with them goes over budget."""
+    return (
+        model.objects.annotate(related_count=Count(related))
+        .order_by("-related_count")
+        .values_list("pk", flat=True)
+        .first()
+    )
+
+
+# (description, function returning the URL to request)
+BUDGET_CHECKS = [
+    ("Site list", lambda: reverse("view_sites")),
+    ("Site list sorted by name", lambda: reverse("view_sites") + "?sort=-name"),
+    ("Equipment list", lambda: reverse("view_equipment")),
+    ("Equipment list sorted by site", lambda: reverse("view_equipment") + "?sort=site"),
+    ("Field note list", lambda: reverse("view_fieldnotes")),
+    ("Photo library", lambda: reverse("view_photos")),
+    (
+        "A site's photos",
+        lambda: reverse("site_photos", args=[busiest(Site, "fieldnotes__photos")]),
+    ),
+    (
+        "Site edit page",
+        lambda: reverse("site_edit", args=[busiest(Site, "fieldnotes")]),
+    ),
+    (
+        "Field note edit page",
+        lambda: reverse("fieldnote_edit", args=[busiest(FieldNote, "photos")]),
+    ),
+    (
+        "Equipment edit page",
+        lambda: reverse("equipment_edit", args=[busiest(Equipment, "history")]),
+    ),
+    (
+        "Photo edit page",
+        lambda: reverse("photo_edit", args=[Photo.objects.values("pk").first()["pk"]]),
+    ),
+    ("Search", lambda: reverse("search") + "?q=a"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the main pages and check that each takes no more SQL "
+        "queries than its view's query_budget. Run against a database "
+        "with realistic data: an N+1 query problem only shows on pages "
+        "with many rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="User to request the pages as (default: the first superuser).",
+        )
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        user = (
+            users.filter(username=username).first()
+            if username
+            else users.filter(is_superuser=True).first()
+        )
+        if user is None:
+            raise CommandError("No such user; give one with --username.")
+        return user
+
+    # Lists are measured uncached, as they'd be after any change
+    @override_settings(ALLOWED_HOSTS=["*"], INVENTORY_LIST_CACHE_TIMEOUT=0)
+    def handle(self, *args, **options):
+        client = Client()
+        client.force_login(self.get_user(options["username"]))
+        failures = []
+        for description, url in BUDGET_CHECKS:
+            try:
+                url = url()
+            except (NoReverseMatch, TypeError):
+                self.stdout.write(f"SKIPPED  {description}: no data")
+                continue
+            response = client.get(url)
+            metrics = response.wsgi_request.metrics
+            summary = (
+                f"{description}: {metrics.queries} queries, "
+                f"budget {metrics.query_budget} ({url})"
+            )
+            if response.status_code != 200:
+                failures.append(description)
+                self.stdout.write(
+                    self.style.ERROR(f"ERROR    {summary}: {response.status_code}")
+                )
+            elif metrics.query_budget is None:
+                self.stdout.write(self.style.WARNING(f"NO BUDGET {summary}"))
+            elif metrics.over_budget:
+                failures.append(description)
+                self.stdout.write(self.style.ERROR(f"OVER     {summary}"))
+            else:
+                self.stdout.write(f"OK       {summary}")
+        if failures:
+            raise CommandError(f"{len(failures)} pages over their query budget.")
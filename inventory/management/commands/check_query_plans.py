@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from inventory import views
+from inventory.models import Equipment, FieldNote, Photo, Site
+from inventory.pagination import CURSOR_NEXT, decode_cursor, encode_cursor
+
+
+def list_view_queryset(view_class, **params):
+    """The query a list view runs for a page, for these GET parameters.
+    For a keyset list that's the second page, as reached from the
+    first page's Next link: the seek predicate matters to the plan."""
+    view = view_class()
+    view.setup(RequestFactory().get("/", params))
+    queryset = view.select_table_fields(view.get_queryset())
+    page_size = view.paginate_by
+    if view.pagination_mode != "keyset":
+        return queryset[:page_size]
+    # The first page's last row, or any value on a tiny table
+    rows = view.keyset_queryset(queryset, reverse=view._sort_descending)
+    last = list(rows.values_list("keyset_value", "pk")[page_size - 1 : page_size])
+    value, pk = last[0] if last else ("", 0)
+    # Through the URL encoding, as values like dates come back as strings
+    cursor = decode_cursor(encode_cursor(value, pk, CURSOR_NEXT))
+    return view.keyset_page_queryset(queryset, cursor, page_size)
+
+
+def first_pk(model):
+    return model.objects.values_list("pk", flat=True).first() or 0
+
+
+# (description, function returning the query, model, index name or
+# tuple of columns of an unnamed index such as a ForeignKey's)
+PLAN_CHECKS = [
+    (
+        "Site list sorted by code",
+        lambda: list_view_queryset(views.SiteListView, sort="code"),
+        Site,
+        "site_code_lower_idx",
+    ),
+    (
+        "Site list sorted by name",
+        lambda: list_view_queryset(views.SiteListView, sort="name"),
+        Site,
+        "site_name_lower_idx",
+    ),
+    (
+        "Equipment list sorted by instrument",
+        lambda: list_view_queryset(views.EquipmentListView, sort="instrument"),
+        Equipment,
+        "equipment_instrument_lower_idx",
+    ),
+    (
+        "Field note list sorted by date",
+        lambda: list_view_queryset(views.FieldNoteListView, sort="date_visited"),
+        FieldNote,
+        "fieldnote_date_idx",
+    ),
+    (
+        "A site's field notes by date (site edit page)",
+        lambda: FieldNote.objects.filter(site_id=first_pk(Site)).order_by(
+            "date_visited"
+        )[:14],
+        FieldNote,
+        "fieldnote_site_date_idx",
+    ),
+    (
+        "A field note's photos",
+        lambda: Photo.objects.filter(fieldnote_id=first_pk(FieldNote))[:14],
+        Photo,
+        ("fieldnote_id",),
+    ),
+]
+
+
+def index_name(model, index):
+    """Resolve a tuple of columns to the name of the index on them."""
+    if isinstance(index, str):
+        return index
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    for name, info in constraints.items():
+        if info["index"] and tuple(info["columns"]) == index:
+            return name
+    raise CommandError(f"No index on {model._meta.db_table}{index}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the main list and detail queries and check that each "
+        "uses the index designed for it. Run against a database with "
+        "realistic data: planners may prefer a table scan on tiny tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print each query plan."
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+        for description, queryset, model, index in PLAN_CHECKS:
+            name = index_name(model, index)
+            plan = queryset().explain()
+            if name in plan:
+                self.stdout.write(f"OK       {description}: uses {name}")
+            else:
+                failures.append(description)
+                self.stdout.write(
+                    self.style.ERROR(f"NO INDEX {description}: expected {name}")
+                )
+            if options["verbose_plans"] or name not in plan:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"{len(failures)} queries don't use their index.")
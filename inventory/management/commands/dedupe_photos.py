@@ -0,0 +1,73 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from inventory import blobs
+from inventory.cache import bump_version
+from inventory.counters import adjust
+from inventory.models import Photo, PhotoBlob
+
+
+class Command(BaseCommand):
+    help = (
+        "Move photo files stored before the content-addressed photo store "
+        "into it, so that copies of the same content share one file, and "
+        "delete the old files. Photos whose files are missing are listed "
+        "and left alone. Derivatives are not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the photos and bytes that would be moved.",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Photo.objects.filter(blob__isnull=True)
+            .order_by("photo")
+            .values_list("photo", flat=True)
+            .distinct()
+        )
+        moved = stored = missing = 0
+        freed = 0
+        # A list, as the loop updates the rows it comes from
+        for name in list(names):
+            if not default_storage.exists(name):
+                self.stdout.write(self.style.WARNING(f"Missing: {name}"))
+                missing += 1
+                continue
+            size = default_storage.size(name)
+            if options["dry_run"]:
+                moved += 1
+                continue
+            with default_storage.open(name) as f:
+                blob_name = blobs.store(f)
+                with transaction.atomic():
+                    blob = blobs.blob_for(blob_name, f)
+                    is_new = blob.ref_count == 0
+                    # update() sends no signals: count the references here,
+                    # and move updated_at on so pages linking the old file
+                    # aren't served from caches
+                    count = Photo.objects.filter(photo=name, blob__isnull=True).update(
+                        photo=blob_name, blob=blob, updated_at=now()
+                    )
+                    adjust(PhotoBlob, blob.pk, "ref_count", count)
+            default_storage.delete(name)
+            moved += 1
+            stored += is_new
+            if not is_new:
+                freed += size
+
+        if options["dry_run"]:
+            self.stdout.write(f"{moved} files would be moved into the photo store.")
+        else:
+            bump_version(Photo)
+            self.stdout.write(
+                f"Moved {moved} files into the photo store: {stored} new, "
+                f"{moved - stored} duplicates ({freed / 2**20:.1f}MB freed)."
+            )
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} files are missing."))
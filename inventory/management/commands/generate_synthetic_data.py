@@ -0,0 +1,285 @@
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.cache import bump_version
+from inventory.counters import rebuild_counters
+from inventory.images import available_formats
+from inventory.models import (
+    Equipment,
+    FieldNote,
+    History,
+    Photo,
+    PhotoBlob,
+    PhotoDerivative,
+    Site,
+)
+from inventory.search import rebuild_index
+
+# Dates are drawn from a fixed range, not from today, so that a seed
+# always gives the same data
+FIRST_DATE = datetime.date(2008, 1, 1)
+LAST_DATE = datetime.date(2025, 12, 31)
+
+WORDS = (
+    "anemometer sonic IRGA datalogger battery solar panel cable tower boom "
+    "mast radiometer net soil heat flux plate thermocouple probe sensor "
+    "calibrated cleaned replaced checked downloaded data card firmware "
+    "enclosure desiccant snow ice frost rain wind fallen branch fence "
+    "gate road access flooded dry canopy understory leaf litter moss "
+    "bog peat water table level logger reset clock drift offset zero "
+    "span gas cylinder pump filter tubing leak heater fan guy wire "
+    "lightning ground rod charge controller voltage low high normal"
+).split()
+INSTRUMENTS = [
+    ("Sonic anemometer", "Campbell Scientific", "CSAT3"),
+    ("Sonic anemometer", "Gill", "WindMaster Pro"),
+    ("Gas analyzer", "LI-COR", "LI-7200RS"),
+    ("Gas analyzer", "LI-COR", "LI-7500DS"),
+    ("Datalogger", "Campbell Scientific", "CR1000X"),
+    ("Net radiometer", "Kipp & Zonen", "CNR4"),
+    ("Quantum sensor", "LI-COR", "LI-190R"),
+    ("Soil heat flux plate", "Hukseflux", "HFP01"),
+    ("Temperature/RH probe", "Vaisala", "HMP155"),
+    ("Rain gauge", "Texas Electronics", "TE525"),
+    ("Soil moisture probe", "Campbell Scientific", "CS655"),
+    ("Solar panel", "", ""),
+    ("Battery", "", ""),
+]
+PEOPLE = [
+    "A. Tremblay",
+    "B. Nguyen",
+    "C. Roy",
+    "D. Singh",
+    "E. Martin",
+    "F. Okafor",
+    "G. Lavoie",
+    "H. Knox",
+]
+# The image that every synthetic photo points at, through one PhotoBlob
+# so that deleting a photo only deletes the file along with the last
+# one. The benchmarks only render pages, which never open the files.
+PHOTO_FILE = "synthetic/photo.jpg"
+
+
+class Generator:
+    def __init__(self, seed, batch_size, stdout):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+
+    def text(self, min_words, max_words):
+        words = self.random.choices(WORDS, k=self.random.randint(min_words, max_words))
+        return " ".join(words).capitalize() + "."
+
+    def date(self, start=FIRST_DATE):
+        days = (LAST_DATE - start).days
+        return start + datetime.timedelta(days=self.random.randint(0, days))
+
+    def weights(self, count):
+        """Skewed weights, so that some parents get several times as
+        many children as others, as the busiest sites do."""
+        return [min(self.random.paretovariate(1.5), 10) for _ in range(count)]
+
+    def save(self, model, objects):
+        """bulk_create objects (an iterable) in batches; returns their
+        pks."""
+        pks = []
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                pks.extend(self.save_batch(model, batch))
+                batch = []
+        if batch:
+            pks.extend(self.save_batch(model, batch))
+        self.stdout.write(f"  {len(pks)} {model.__name__} rows")
+        return pks
+
+    def save_batch(self, model, batch):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+            if created[0].pk is None:
+                # MySQL doesn't return the new pks. Nothing else writes
+                # to a benchmark database, so they're the highest ones.
+                return list(
+                    model.objects.order_by("-pk").values_list("pk", flat=True)[
+                        : len(batch)
+                    ]
+                )
+        return [obj.pk for obj in created]
+
+    def sites(self, count):
+        for n in range(1, count + 1):
+            activated = self.date()
+            yield Site(
+                name=f"Synthetic site {n}",
+                code=f"SY-{n:03}",
+                amp=f"US-S{n:02}"[:10],
+                location=f"{self.random.uniform(42, 60):.4f}N "
+                f"{self.random.uniform(60, 130):.4f}W",
+                description=self.text(20, 200),
+                date_activated=activated,
+                date_retired=(
+                    self.date(activated) if self.random.random() < 0.1 else None
+                ),
+                gps_coordinates=f"{self.random.uniform(42, 60):.5f}, "
+                f"{-self.random.uniform(60, 130):.5f}",
+            )
+
+    def fieldnotes(self, count, site_pks):
+        sites = self.random.choices(site_pks, self.weights(len(site_pks)), k=count)
+        for site_id in sites:
+            yield FieldNote(
+                site_id=site_id,
+                note=self.text(10, 400),
+                date_visited=self.date(),
+                summary=self.text(2, 10)[:80] if self.random.random() < 0.8 else "",
+                submitter=self.random.choice(PEOPLE),
+                site_visitors=", ".join(
+                    self.random.sample(PEOPLE, self.random.randint(0, 3))
+                ),
+            )
+
+    def equipment(self, count, site_pks):
+        for n in range(1, count + 1):
+            instrument, manufacturer, model_number = self.random.choice(INSTRUMENTS)
+            yield Equipment(
+                instrument=instrument,
+                manufacturer=manufacturer,
+                model_number=model_number,
+                serial_number=f"SN{n:07}" if self.random.random() < 0.9 else "",
+                date_purchased=self.date(),
+                notes=self.text(0, 60) if self.random.random() < 0.5 else "",
+                # Some is in storage
+                site_id=(
+                    self.random.choice(site_pks)
+                    if self.random.random() < 0.85
+                    else None
+                ),
+            )
+
+    def history(self, count, equipment_pks):
+        items = self.random.choices(
+            equipment_pks, self.weights(len(equipment_pks)), k=count
+        )
+        for item_id in items:
+            yield History(item_id=item_id, date=self.date(), note=self.text(3, 80))
+
+    def photos(self, count, fieldnote_pks):
+        fieldnotes = self.random.choices(
+            fieldnote_pks, self.weights(len(fieldnote_pks)), k=count
+        )
+        # Its ref_count is set by rebuild_counters() at the end
+        blob, _ = PhotoBlob.objects.get_or_create(file=PHOTO_FILE, defaults={"size": 0})
+        for fieldnote_id in fieldnotes:
+            yield Photo(
+                fieldnote_id=fieldnote_id,
+                photo=PHOTO_FILE,
+                blob=blob,
+                date_taken=self.date(),
+                taken_by=self.random.choice(PEOPLE),
+                width=4000,
+                height=3000,
+            )
+
+    def derivatives(self, photo_pks, sizes, formats):
+        for photo_id in photo_pks:
+            for kind, max_side in sizes.items():
+                for fmt in formats:
+                    yield PhotoDerivative(
+                        photo_id=photo_id,
+                        kind=kind,
+                        format=fmt,
+                        # Names of their own, as deleting a row deletes
+                        # its file
+                        file=f"synthetic/{photo_id}_{kind}.{fmt}",
+                        width=max_side,
+                        height=max_side * 3 // 4,
+                    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with synthetic sites, field notes, photos "
+        "and equipment with history, at a chosen scale, for benchmarking "
+        "(see benchmark_views). The same --seed gives the same data. "
+        "Photos share one placeholder file and have derivative rows "
+        "but no image files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sites", type=int, default=50)
+        parser.add_argument("--fieldnotes", type=int, default=20000)
+        parser.add_argument("--photos", type=int, default=200000)
+        parser.add_argument("--equipment", type=int, default=10000)
+        parser.add_argument(
+            "--history", type=int, default=50000, help="Equipment history entries."
+        )
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiply every count above except --sites by this, "
+            "e.g. 0.01 for a quick run.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--no-derivatives",
+            action="store_true",
+            help="Don't create derivative rows, as if no photo had been "
+            "processed yet.",
+        )
+        parser.add_argument(
+            "--append",
+            action="store_true",
+            help="Add to a database that already has data.",
+        )
+
+    def handle(self, *args, **options):
+        if Site.objects.exists() and not options["append"]:
+            raise CommandError(
+                "The database already has sites. Generate into an empty "
+                "database (e.g. a copy made for benchmarking), or pass --append."
+            )
+        scale = options["scale"]
+        counts = {
+            name: max(1, round(options[name] * scale))
+            for name in ("fieldnotes", "photos", "equipment", "history")
+        }
+        generator = Generator(options["seed"], options["batch_size"], self.stdout)
+        start = time.perf_counter()
+
+        site_pks = generator.save(Site, generator.sites(options["sites"]))
+        fieldnote_pks = generator.save(
+            FieldNote, generator.fieldnotes(counts["fieldnotes"], site_pks)
+        )
+        photo_pks = generator.save(
+            Photo, generator.photos(counts["photos"], fieldnote_pks)
+        )
+        if not options["no_derivatives"]:
+            generator.save(
+                PhotoDerivative,
+                generator.derivatives(
+                    photo_pks, settings.PHOTO_DERIVATIVE_SIZES, available_formats()
+                ),
+            )
+        equipment_pks = generator.save(
+            Equipment, generator.equipment(counts["equipment"], site_pks)
+        )
+        generator.save(History, generator.history(counts["history"], equipment_pks))
+
+        # bulk_create sends no signals
+        self.stdout.write("Rebuilding counters and the search index...")
+        rebuild_counters()
+        rebuild_index()
+        for model in (Site, FieldNote, Photo, Equipment, History):
+            bump_version(model)
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated data in {time.perf_counter() - start:.1f}s.")
+        )
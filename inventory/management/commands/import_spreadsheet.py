@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import IMPORTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import equipment, equipment history or field notes from a .csv or "
+        ".xlsx file, validating each row as the edit pages do."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="The .csv or .xlsx file to import.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Check every row and report errors without saving anything.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Rows per bulk_create transaction (default IMPORT_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options["kind"]](batch_size=options["batch_size"])
+        try:
+            with open(options["path"], "rb") as f:
+                result = importer.run(
+                    read_rows(f, options["path"]), dry_run=options["dry_run"]
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for number, messages in result.errors:
+            for message in messages:
+                self.stderr.write(f"Row {number}: {message}")
+        verb = "Checked" if options["dry_run"] else "Imported"
+        summary = (
+            f"{verb} {result.created} of {result.rows} rows in "
+            f"{result.seconds:.2f}s ({result.rows_per_second:.0f} rows/s), "
+            f"{len(result.errors)} with errors."
+        )
+        style = self.style.WARNING if result.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,174 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def request_head(method, host, path, cookie, headers=""):
+    cookie = f"Cookie: {cookie}\r\n" if cookie else ""
+    return (
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n{cookie}{headers}"
+        f"Connection: close\r\n\r\n"
+    ).encode()
+
+
+async def slow_client(host, port, path, cookie, body_size, chunk_size, interval):
+    """POST a body of body_size bytes, sending the request chunk_size
+    bytes every interval seconds, like a phone uploading a photo over a
+    poor connection. Starts over when the server answers."""
+    request = request_head(
+        "POST",
+        host,
+        path,
+        cookie,
+        f"Content-Type: application/octet-stream\r\nContent-Length: {body_size}\r\n",
+    ) + (b"x" * body_size)
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(interval)
+            continue
+        try:
+            for start in range(0, len(request), chunk_size):
+                writer.write(request[start : start + chunk_size])
+                await writer.drain()
+                await asyncio.sleep(interval)
+            await reader.read()
+        except ConnectionError:
+            await asyncio.sleep(interval)
+        finally:
+            writer.close()
+
+
+async def probe(host, port, path, cookie, timeout):
+    """Seconds taken to GET path, or None if it failed or timed out."""
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request_head("GET", host, path, cookie))
+            response = await reader.read()
+            writer.close()
+    except (TimeoutError, OSError):
+        return None
+    if not response.startswith((b"HTTP/1.1 2", b"HTTP/1.1 3")):
+        return None
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server with slow uploading clients: for each "
+        "number of clients in --steps, keep that many POSTs trickling in "
+        "and time GET requests alongside them. Reports the most slow "
+        "clients the server takes while the 95th percentile GET stays "
+        "under --threshold milliseconds. Compare the WSGI and ASGI "
+        "deployments with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument(
+            "--probe-path",
+            default="/accounts/login/",
+            help="Path to time GET requests to.",
+        )
+        parser.add_argument(
+            "--upload-path",
+            default="/accounts/login/",
+            help="Path the slow clients POST to.",
+        )
+        parser.add_argument(
+            "--cookie",
+            default="",
+            help='Cookie header to send, e.g. "sessionid=..." to test pages '
+            "that need a login.",
+        )
+        parser.add_argument(
+            "--steps",
+            default="10,25,50,100",
+            help="Comma-separated numbers of slow clients.",
+        )
+        parser.add_argument(
+            "--probes", type=int, default=20, help="GET requests per step."
+        )
+        parser.add_argument(
+            "--body-size", type=int, default=256 * 1024, help="Bytes per upload."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=4096, help="Bytes sent at a time."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.25,
+            help="Seconds between a slow client's chunks.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=500,
+            help="Acceptable 95th percentile GET time, in milliseconds.",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=10, help="Seconds before a GET fails."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            steps = [int(step) for step in options["steps"].split(",")]
+        except ValueError:
+            raise CommandError("--steps must be comma-separated numbers.")
+        asyncio.run(self.run(steps, options))
+
+    async def run(self, steps, options):
+        host, port = options["host"], options["port"]
+        probe_args = (host, port, options["probe_path"], options["cookie"])
+        if await probe(*probe_args, options["timeout"]) is None:
+            raise CommandError(f"GET {options['probe_path']} on {host}:{port} failed.")
+
+        best = 0
+        for count in steps:
+            clients = [
+                asyncio.create_task(
+                    slow_client(
+                        host,
+                        port,
+                        options["upload_path"],
+                        options["cookie"],
+                        options["body_size"],
+                        options["chunk_size"],
+                        options["interval"],
+                    )
+                )
+                for _ in range(count)
+            ]
+            # Let the clients connect and start sending
+            await asyncio.sleep(1)
+            times = []
+            for _ in range(options["probes"]):
+                times.append(await probe(*probe_args, options["timeout"]))
+            for client in clients:
+                client.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+
+            failed = times.count(None)
+            # Failures count as the slowest times
+            millis = sorted(t * 1000 if t is not None else float("inf") for t in times)
+            p50 = statistics.median(millis)
+            p95 = millis[min(len(millis) - 1, int(len(millis) * 0.95))]
+            ok = p95 <= options["threshold"]
+            if ok:
+                best = count
+            line = (
+                f"{count:5} slow clients: GET p50 {p50:.0f}ms, "
+                f"p95 {p95:.0f}ms, {failed} failed"
+            )
+            self.stdout.write(line if ok else self.style.WARNING(line))
+
+        self.stdout.write(
+            f"Most slow clients with p95 under {options['threshold']:.0f}ms: {best}"
+        )
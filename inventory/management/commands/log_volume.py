@@ -0,0 +1,69 @@
+import glob
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the lines and bytes in the JSON log file (and its rotated "
+        "copies) by logger and level, and the actions logged, to show "
+        "what is filling the log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Only count lines from the last this many hours (0 for all).",
+        )
+        parser.add_argument("--file", default=settings.LOG_FILE)
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(f"{options['file']}*"))
+        if not paths:
+            raise CommandError(f"No log file {options['file']}.")
+        since = None
+        if options["hours"]:
+            since = datetime.now() - timedelta(hours=options["hours"])
+
+        lines = Counter()
+        size = Counter()
+        actions = Counter()
+        unparsed = 0
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        time = datetime.fromisoformat(entry["time"])
+                    except (ValueError, KeyError, TypeError):
+                        # Tracebacks from the console format, and lines
+                        # from before the log was JSON
+                        unparsed += 1
+                        continue
+                    if since and time < since:
+                        continue
+                    key = f"{entry.get('logger')} {entry.get('level')}"
+                    lines[key] += 1
+                    size[key] += len(line)
+                    if "action" in entry:
+                        actions[f"{entry.get('model') or '-'} {entry['action']}"] += 1
+
+        period = f"the last {options['hours']:g} hours" if since else "all time"
+        self.stdout.write(
+            f"{sum(lines.values())} lines, {sum(size.values()) / 1024:.0f}KB, "
+            f"in {period} ({len(paths)} files):"
+        )
+        for key, count in lines.most_common():
+            self.stdout.write(f"  {count:8}  {size[key] / 1024:8.0f}KB  {key}")
+        if actions:
+            self.stdout.write("Actions:")
+            for key, count in actions.most_common():
+                self.stdout.write(f"  {count:8}  {key}")
+        if unparsed:
+            self.stdout.write(f"{unparsed} lines weren't JSON log entries.")
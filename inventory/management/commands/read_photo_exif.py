@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+from PIL import Image
+
+from inventory.cache import bump_version
+from inventory.images import EXIF_FIELDS, read_exif
+from inventory.models import Photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Read the EXIF capture time, GPS position, camera and orientation "
+        "of photos processed before these were read on upload. Only file "
+        "headers are read. Each batch is saved as it's done, so a run "
+        "that is interrupted carries on where it stopped when started "
+        "again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Read every photo again, not just those not read yet.",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            Photo.objects.update(exif_read=False)
+        pending = Photo.objects.filter(exif_read=False)
+        total = pending.count()
+        read = failed = 0
+        last_pk = 0
+        while True:
+            # Seek on pk, past photos that failed, rather than offset
+            batch = list(
+                pending.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", "photo", *EXIF_FIELDS)[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            done = []
+            for photo in batch:
+                try:
+                    read_exif(photo)
+                except FileNotFoundError:
+                    # Left to be read once the file is restored
+                    self.stdout.write(
+                        self.style.WARNING(f"Photo {photo.pk}: file is missing.")
+                    )
+                    failed += 1
+                    continue
+                except (
+                    OSError,
+                    SyntaxError,
+                    ValueError,
+                    Image.DecompressionBombError,
+                ) as e:
+                    self.stdout.write(self.style.WARNING(f"Photo {photo.pk}: {e}"))
+                    failed += 1
+                    # There's nothing to read
+                    photo.exif_read = True
+                photo.updated_at = now()
+                done.append(photo)
+            with transaction.atomic():
+                Photo.objects.bulk_update(
+                    done, [*EXIF_FIELDS, "exif_read", "updated_at"]
+                )
+            read += len(batch)
+            self.stdout.write(f"Read {read} of {total} photos.")
+
+        # bulk_update() sends no signals
+        bump_version(Photo)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Read EXIF tags of {read - failed} photos, {failed} failed."
+            )
+        )
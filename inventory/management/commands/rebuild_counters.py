@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized fieldnote, equipment, photo and history "
+        "counts on sites, field notes and equipment, and the reference "
+        "counts of stored photo files."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_counters()
+        self.stdout.write(self.style.SUCCESS("Counters rebuilt."))
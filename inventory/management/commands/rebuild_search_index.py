@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search documents for all sites, field notes "
+        "and equipment."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} items."))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from inventory import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued post-upload photo processing jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for more jobs.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Requeue jobs that used up all their attempts before starting.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds to wait between polls of an empty queue.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes resizing photos in parallel (default "
+            "PHOTO_PROCESS_WORKERS, or one per CPU); 0 to resize them in "
+            "this process.",
+        )
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            requeued = jobs.retry_failed()
+            self.stdout.write(f"Requeued {requeued} failed jobs.")
+        try:
+            count = jobs.work(
+                burst=options["burst"],
+                poll_interval=options["poll_interval"],
+                workers=options["workers"],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} photo jobs."))
@@ -0,0 +1,167 @@
+"""Per-request metrics: SQL queries, database time, template rendering
+time and total time, by URL name.
+
+RequestMetricsMiddleware logs a line per request to the
+"inventory.metrics" logger and, if SERVER_TIMING is on, sends the
+figures in a Server-Timing header, which browsers show with the
+request in their developer tools' network panel.
+
+A view class can declare query_budget, the most queries a request to it
+should take. The budget is meant to be independent of the page size:
+a view whose query count grows with the number of rows shown has an N+1
+problem. Requests over budget are logged as warnings, and
+`manage.py check_query_budgets` requests every budgeted page and fails
+if any goes over.
+
+"""
+
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("inventory.metrics")
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.url_name = None
+        self.query_budget = None
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def over_budget(self):
+        return self.query_budget is not None and self.queries > self.query_budget
+
+    def __call__(self, execute, sql, params, many, context):
+        """Wrapper for connection.execute_wrapper() counting queries."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+    def server_timing(self, total_seconds):
+        return ", ".join(
+            [
+                f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_seconds * 1000:.1f}",
+                f"total;dur={total_seconds * 1000:.1f}",
+            ]
+        )
+
+
+@contextmanager
+def timing_templates(request):
+    """Count the time spent in the block as template rendering, for
+    templates rendered by the view itself rather than its response."""
+    metrics = getattr(request, "metrics", None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.template_seconds += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware:
+    """Put this first in MIDDLEWARE so that the times cover the other
+    middleware, and template rendering (which happens after every
+    middleware's process_template_response()) is timed.
+
+    Works under WSGI and ASGI alike, so that it doesn't force async
+    views to run in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.metrics = metrics = RequestMetrics()
+        # Streaming responses (exports) run most of their queries after
+        # this returns, as they're sent; those aren't counted.
+        with wrap_connections(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        request.metrics = metrics = RequestMetrics()
+        # Connections belong to a thread, and a request's queries (from
+        # async views too) run in the thread its sync code runs in, not
+        # in this one.
+        wrappers = await sync_to_async(wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        metrics = request.metrics
+        total_seconds = metrics.total_seconds
+
+        level = logging.WARNING if metrics.over_budget else logging.INFO
+        if logger.isEnabledFor(level):
+            fields = {
+                "method": request.method,
+                "url_name": metrics.url_name or "-",
+                "status": response.status_code,
+                "queries": metrics.queries,
+                "query_budget": metrics.query_budget,
+                "db_ms": round(metrics.db_seconds * 1000, 1),
+                "template_ms": round(metrics.template_seconds * 1000, 1),
+                "total_ms": round(total_seconds * 1000, 1),
+            }
+            message = (
+                "%(method)s %(url_name)s %(status)s: %(queries)s queries, "
+                "db %(db_ms)sms, templates %(template_ms)sms, total %(total_ms)sms"
+            )
+            if metrics.over_budget:
+                message += " (over budget of %(query_budget)s)"
+            logger.log(level, message, fields, extra=fields)
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing(total_seconds)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        request.metrics.url_name = request.resolver_match.view_name
+        request.metrics.query_budget = getattr(view_class, "query_budget", None)
+
+    def process_template_response(self, request, response):
+        # Responses are rendered once this (the last of the
+        # process_template_response() hooks) returns
+        metrics = request.metrics
+        start = time.perf_counter()
+
+        def rendered(response):
+            metrics.template_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def wrap_connections(wrapper):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
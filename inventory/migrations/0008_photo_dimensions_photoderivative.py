@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:58
+
+import django.db.models.deletion
+import inventory.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_rename_date_submitted_fieldnote_date_visited'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PhotoDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('format', models.CharField(choices=[('jpeg', 'JPEG'), ('webp', 'WebP'), ('avif', 'AVIF')], max_length=10)),
+                ('file', models.ImageField(upload_to=inventory.models.photo_derivative_upload_path)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='inventory.photo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('photo', 'kind', 'format'), name='unique_photo_derivative')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_photo_dimensions_photoderivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='inventory.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='photojob_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('photo', 'task'), name='unique_photo_job')],
+            },
+        ),
+    ]
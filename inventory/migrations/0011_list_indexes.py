@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:01
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0010_photoupload"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                django.db.models.functions.text.Lower("instrument"),
+                name="equipment_instrument_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fieldnote",
+            index=models.Index(
+                fields=["site", "date_visited"], name="fieldnote_site_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fieldnote",
+            index=models.Index(fields=["date_visited"], name="fieldnote_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="site",
+            index=models.Index(
+                django.db.models.functions.text.Lower("code"),
+                name="site_code_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="site",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="site_name_lower_idx",
+            ),
+        ),
+    ]
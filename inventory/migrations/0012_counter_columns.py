@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, parent_lookup):
+    counts = (
+        model.objects.filter(**{parent_lookup: OuterRef("pk")})
+        .order_by()
+        .values(parent_lookup)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    Site = apps.get_model("inventory", "Site")
+    FieldNote = apps.get_model("inventory", "FieldNote")
+    Equipment = apps.get_model("inventory", "Equipment")
+    History = apps.get_model("inventory", "History")
+    Photo = apps.get_model("inventory", "Photo")
+    Site.objects.update(
+        fieldnotes_count=count_of(FieldNote, "site"),
+        equipment_count=count_of(Equipment, "site"),
+        photo_count=count_of(Photo, "fieldnote__site"),
+    )
+    FieldNote.objects.update(photo_count=count_of(Photo, "fieldnote"))
+    Equipment.objects.update(history_count=count_of(History, "item"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0011_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipment",
+            name="history_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="fieldnote",
+            name="photo_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="site",
+            name="equipment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="site",
+            name="fieldnotes_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="site",
+            name="photo_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="fieldnote",
+            index=models.Index(
+                django.db.models.functions.text.Lower("date_visited"),
+                name="fieldnote_date_lower_idx",
+            ),
+        ),
+    ]
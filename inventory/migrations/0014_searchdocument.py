@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+# The full-text index over SearchDocument.title and .body, see
+# inventory/search.py. Documents for existing rows are created by
+# `manage.py rebuild_search_index`.
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE inventory_searchdocument_fts USING fts5(
+        title, body,
+        content='inventory_searchdocument', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    # Keep the FTS5 table in step with its content table
+    """
+    CREATE TRIGGER inventory_searchdocument_ai
+    AFTER INSERT ON inventory_searchdocument BEGIN
+        INSERT INTO inventory_searchdocument_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_searchdocument_ad
+    AFTER DELETE ON inventory_searchdocument BEGIN
+        INSERT INTO inventory_searchdocument_fts(
+            inventory_searchdocument_fts, rowid, title, body
+        ) VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_searchdocument_au
+    AFTER UPDATE ON inventory_searchdocument BEGIN
+        INSERT INTO inventory_searchdocument_fts(
+            inventory_searchdocument_fts, rowid, title, body
+        ) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO inventory_searchdocument_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_au",
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_ai",
+    "DROP TABLE IF EXISTS inventory_searchdocument_fts",
+]
+# InnoDB builds one FULLTEXT index per statement
+MYSQL_INDEX = [
+    "ALTER TABLE inventory_searchdocument "
+    "ADD FULLTEXT INDEX searchdocument_text_ft (title, body)",
+    "ALTER TABLE inventory_searchdocument "
+    "ADD FULLTEXT INDEX searchdocument_title_ft (title)",
+]
+MYSQL_DROP = [
+    "ALTER TABLE inventory_searchdocument DROP INDEX searchdocument_title_ft",
+    "ALTER TABLE inventory_searchdocument DROP INDEX searchdocument_text_ft",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+create_index = run_for_vendor({"sqlite": SQLITE_INDEX, "mysql": MYSQL_INDEX})
+drop_index = run_for_vendor({"sqlite": SQLITE_DROP, "mysql": MYSQL_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0013_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("site", "Site"),
+                            ("fieldnote", "Field note"),
+                            ("equipment", "Equipment"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("label", models.CharField(max_length=250)),
+                ("title", models.CharField(blank=True, max_length=250)),
+                ("body", models.TextField(blank=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id"), name="unique_search_document"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0014_searchdocument"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="fieldnote",
+            name="fieldnote_date_lower_idx",
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+import django.db.models.deletion
+import inventory.models
+import inventory.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0015_drop_fieldnote_date_lower_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0, editable=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="photo",
+            field=models.ImageField(
+                storage=inventory.storage.BlobStorage(),
+                upload_to=inventory.models.site_photo_upload_path,
+            ),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="photos",
+                to="inventory.photoblob",
+            ),
+        ),
+    ]
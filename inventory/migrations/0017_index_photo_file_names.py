@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:02
+
+import inventory.models
+import inventory.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0016_photo_blobs"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="photo",
+            name="photo",
+            field=models.ImageField(
+                db_index=True,
+                storage=inventory.storage.BlobStorage(),
+                upload_to=inventory.models.site_photo_upload_path,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photoderivative",
+            name="file",
+            field=models.ImageField(
+                db_index=True, upload_to=inventory.models.photo_derivative_upload_path
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0017_index_photo_file_names"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="camera",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="exif_read",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="orientation",
+            field=models.PositiveSmallIntegerField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="taken_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(fields=["taken_at"], name="photo_taken_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="photo_position_idx"
+            ),
+        ),
+    ]
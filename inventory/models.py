@@ -4,12 +4,48 @@
 import os
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.conf import settings
-from django.utils.timezone import now
+from django.utils.timezone import localdate, now
 
+from .storage import BLOB_DIR, blob_storage
 
-class Site(models.Model):
+
+class CountedModel(models.Model):
+    """Base for models that have, or are counted by, the counter
+    columns maintained in inventory/counters.py.
+
+    Saves run inside a transaction, so that the counter updates made by
+    the post_save receivers in inventory/signals.py commit or roll
+    back together with the row. (Deletes are already atomic.)
+
+    Counter columns are only ever changed by UPDATEs, so save() of an
+    existing row leaves the columns named in counter_fields alone:
+    otherwise saving a stale instance would overwrite them.
+    """
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (
+            self.counter_fields
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class Site(CountedModel):
     name = models.CharField(max_length=50)  # , help_text="Site name")
     code = models.CharField(max_length=10)  # , help_text="Short code for internal use")
     amp = models.CharField(
@@ -20,6 +56,20 @@ class Site(models.Model):
     date_activated = models.DateField()
     date_retired = models.DateField(blank=True, null=True)
     gps_coordinates = models.CharField(max_length=50, blank=True)
+    # Maintained by inventory/counters.py, see there.
+    fieldnotes_count = models.PositiveIntegerField(default=0, editable=False)
+    equipment_count = models.PositiveIntegerField(default=0, editable=False)
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    counter_fields = ("fieldnotes_count", "equipment_count", "photo_count")
+
+    class Meta:
+        indexes = [
+            # SortedListMixin sorts text case-insensitively, on Lower(field)
+            models.Index(Lower("code"), name="site_code_lower_idx"),
+            models.Index(Lower("name"), name="site_name_lower_idx"),
+        ]
 
     def __str__(self):
         return f"{self.code}: {self.name}"
@@ -31,9 +81,10 @@ class DOI(models.Model):
     label = models.CharField(max_length=20)
     doi_link = models.URLField()
     site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name="doi_records")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
-class Equipment(models.Model):
+class Equipment(CountedModel):
     instrument = models.CharField(max_length=75)
     manufacturer = models.CharField(max_length=75, blank=True)
     model_number = models.CharField(max_length=75, blank=True)
@@ -43,26 +94,51 @@ class Equipment(models.Model):
     site = models.ForeignKey(
         Site, on_delete=models.SET_NULL, null=True, blank=True, related_name="equipment"
     )
+    history_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    counter_fields = ("history_count",)
+
+    class Meta:
+        indexes = [
+            models.Index(Lower("instrument"), name="equipment_instrument_lower_idx"),
+        ]
 
     def __str__(self):
         return f"{self.instrument} - {self.serial_number}"
 
 
-class History(models.Model):
+class History(CountedModel):
     date = models.DateField(default=now)
     note = models.TextField()
     item = models.ForeignKey(
         Equipment, related_name="history", on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
-class FieldNote(models.Model):
+class FieldNote(CountedModel):
     site = models.ForeignKey(Site, related_name="fieldnotes", on_delete=models.CASCADE)
     note = models.TextField()
     date_visited = models.DateField(default=now)
     summary = models.CharField(max_length=80, blank=True)
     submitter = models.CharField(max_length=50, blank=True)
     site_visitors = models.CharField(max_length=250, blank=True, default="")
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    counter_fields = ("photo_count",)
+
+    class Meta:
+        indexes = [
+            # A site's notes in date order (SiteUpdateView). Also covers
+            # lookups by site alone, like the plain FK index.
+            models.Index(
+                fields=["site", "date_visited"], name="fieldnote_site_date_idx"
+            ),
+            # The field note list's default order (see apply_sort_parameters)
+            models.Index(fields=["date_visited"], name="fieldnote_date_idx"),
+        ]
 
 
 def site_photo_upload_path(instance, filename):
@@ -75,13 +151,76 @@ def site_photo_upload_path(instance, filename):
     return os.path.join("site_photos", f"site_{site_id}", unique_name)
 
 
-class Photo(models.Model):
-    photo = models.ImageField(upload_to=site_photo_upload_path)
+class PhotoBlob(CountedModel):
+    """A photo file in the content-addressed store (inventory/storage.py),
+    shared by every Photo of the same content. ref_count counts them;
+    the file is deleted with the last, see inventory/blobs.py."""
+
+    # Storage name, made from the SHA-256 of the content
+    file = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    counter_fields = ("ref_count",)
+
+    def __str__(self):
+        return f"{self.file} ({self.ref_count} photos)"
+
+
+class Photo(CountedModel):
+    # upload_to only supplies the extension: blob_storage names files
+    # by content
+    # (Indexed for check_media, which looks files up by name)
+    photo = models.ImageField(
+        upload_to=site_photo_upload_path, storage=blob_storage, db_index=True
+    )
+    # None for files stored before the content-addressed store
+    blob = models.ForeignKey(
+        PhotoBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="photos",
+    )
     date_taken = models.DateField(blank=True, null=True)
     taken_by = models.CharField(max_length=100, blank=True)
     fieldnote = models.ForeignKey(
         FieldNote, on_delete=models.CASCADE, related_name="photos"
     )
+    # Dimensions of the original, filled in when derivatives are built.
+    # (Not ImageField's width_field/height_field: those re-open the
+    # file on every instantiation while they're still empty.)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    # Read from the original's EXIF tags along with the dimensions (see
+    # inventory/images.py), or by `manage.py read_photo_exif`
+    taken_at = models.DateTimeField(blank=True, null=True, editable=False)
+    latitude = models.FloatField(blank=True, null=True, editable=False)
+    longitude = models.FloatField(blank=True, null=True, editable=False)
+    camera = models.CharField(max_length=100, blank=True, editable=False)
+    orientation = models.PositiveSmallIntegerField(
+        blank=True, null=True, editable=False
+    )
+    exif_read = models.BooleanField(default=False, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Galleries sorted and filtered by capture time and position
+            models.Index(fields=["taken_at"], name="photo_taken_at_idx"),
+            models.Index(fields=["latitude", "longitude"], name="photo_position_idx"),
+        ]
+
+    @property
+    def capture_date(self):
+        """The date the photo was taken: by the camera's clock, else as
+        entered on upload, else the date of the visit."""
+        if self.taken_at:
+            return localdate(self.taken_at)
+        return self.date_taken or self.fieldnote.date_visited
 
     # # OR:
     # @property
@@ -89,6 +228,170 @@ class Photo(models.Model):
     #     return self.fieldnote.date
 
 
+class PhotoUpload(models.Model):
+    """A chunked, resumable upload of one photo file.
+
+    Chunks are appended to a partial file (self.file) in the default
+    storage. When all self.size bytes have arrived it is copied into the
+    photo store, and the Photo row is created and linked here.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    fieldnote = models.ForeignKey(
+        FieldNote, on_delete=models.CASCADE, related_name="uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Storage name of the partial file, then of the stored photo
+    file = models.CharField(max_length=255)
+    date_taken = models.DateField(blank=True, null=True)
+    taken_by = models.CharField(max_length=100, blank=True)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    photo = models.OneToOneField(
+        "Photo", on_delete=models.SET_NULL, null=True, blank=True, related_name="upload"
+    )
+
+    @property
+    def received_all(self):
+        return self.received >= self.size
+
+    @property
+    def complete(self):
+        """True once the file is in the photo store and its Photo has
+        been created; a fully received file may still be waiting for
+        that if finish_upload() failed part way."""
+        return not self.partial
+
+    @property
+    def partial(self):
+        """True while self.file is the partial file, not yet replaced by
+        the stored photo's name."""
+        return not self.file.startswith(f"{BLOB_DIR}/")
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+
+def photo_derivative_upload_path(instance, filename):
+    # Keep derivatives next to their originals
+    site_id = instance.photo.fieldnote.site_id
+    return os.path.join("site_photos", f"site_{site_id}", "derivatives", filename)
+
+
+class PhotoDerivative(models.Model):
+    """A resized, re-encoded copy of a Photo used for display, so
+    galleries don't download full-size camera originals. The sizes and
+    formats built are set by PHOTO_DERIVATIVE_SIZES and
+    PHOTO_DERIVATIVE_FORMATS, see inventory/images.py."""
+
+    FORMAT_CHOICES = [
+        ("jpeg", "JPEG"),
+        ("webp", "WebP"),
+        ("avif", "AVIF"),
+    ]
+
+    photo = models.ForeignKey(
+        Photo, on_delete=models.CASCADE, related_name="derivatives"
+    )
+    kind = models.CharField(max_length=20)  # eg "thumbnail", "medium"
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    # Indexed for check_media, which looks files up by name
+    file = models.ImageField(upload_to=photo_derivative_upload_path, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["photo", "kind", "format"], name="unique_photo_derivative"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.format} {self.width}x{self.height}"
+
+
+class PhotoJob(models.Model):
+    """A unit of post-upload processing for a Photo, run outside the
+    request by the run_photo_jobs worker command. See inventory/jobs.py
+    for the tasks and the claim/retry logic."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name="jobs")
+    task = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["photo", "task"], name="unique_photo_job"),
+        ]
+        indexes = [
+            # The worker's "what's due?" query
+            models.Index(fields=["status", "run_after"], name="photojob_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} for photo {self.photo_id}: {self.status}"
+
+
+class SearchDocument(models.Model):
+    """The searchable text of one Site, FieldNote or Equipment item
+    (with its History), kept up to date by the receivers in
+    inventory/signals.py.
+
+    The full-text index over title and body is database specific (a
+    FULLTEXT index on MySQL, an FTS5 table on SQLite) and is created by
+    migration 0014, see inventory/search.py.
+    """
+
+    SITE = "site"
+    FIELDNOTE = "fieldnote"
+    EQUIPMENT = "equipment"
+    KIND_CHOICES = [
+        (SITE, "Site"),
+        (FIELDNOTE, "Field note"),
+        (EQUIPMENT, "Equipment"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # Shown in results, not searched
+    label = models.CharField(max_length=250)
+    # Ranked above matches in body
+    title = models.CharField(max_length=250, blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="unique_search_document"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.label}"
+
+
 # class Document(models.Model):
 #     date_uploaded = models.DateField(default=now)
 #     submitter = models.CharField(max_length=50, blank=True)
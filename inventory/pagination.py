@@ -0,0 +1,129 @@
+"""Pagination helpers for SortedListMixin.
+
+Django's Paginator uses OFFSET/LIMIT plus a COUNT(*) query. Both get
+slower the further into a long table you go, so the list views can
+opt into one of the cheaper schemes below instead.
+
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# ====== Offset pagination without COUNT(*) ======
+
+
+class CountlessPage(Page):
+    """A Page that knows whether a next page exists without counting
+    all the rows."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountlessPaginator(Paginator):
+    """Offset paginator that never issues a COUNT(*) query.
+
+    It fetches one row more than a page holds to find out whether
+    there's a next page. Anything that needs the total (num_pages,
+    page_range, page=last) is unavailable.
+    """
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return CountlessPage(
+            rows[: self.per_page],
+            number,
+            self,
+            has_next=len(rows) > self.per_page,
+        )
+
+
+# ====== Keyset (seek) pagination ======
+
+CURSOR_NEXT = "n"
+CURSOR_PREVIOUS = "p"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(value, pk, direction):
+    """Pack a sort key value and pk into an opaque, URL-safe string."""
+    payload = json.dumps([value, pk, direction], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, field=None, nullable=False):
+    """Reverse encode_cursor(). Returns (value, pk, direction).
+
+    Cursors come from the URL, so anyone can make one up: if field (the
+    model field of the sort key) is given, the value is converted with
+    its to_python(), and must not be None unless nullable. Anything
+    that doesn't fit raises InvalidCursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or type(pk) is not int:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if isinstance(value, (list, dict)) or (value is None and not nullable):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if field is not None and value is not None:
+        try:
+            value = field.to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return value, pk, direction
+
+
+class KeysetPage:
+    """One page of keyset-paginated results.
+
+    Provides the parts of django.core.paginator.Page that the list
+    templates use, plus the cursors for the neighbouring pages.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
@@ -0,0 +1,99 @@
+"""Read replica routing for the list views.
+
+When DATABASES has a "replica" (see EcoFlux/settings/production.py),
+SortedListMixin runs its reads inside replica_reads(), which sends them
+to the replica; everything else reads and writes the primary.
+
+A replica lags the primary a little, so:
+
+- RecentWriteMiddleware notes in the session when a user last changed
+  something, and that user reads from the primary for
+  DB_REPLICA_MAX_LAG seconds afterwards. Saving an item and being sent
+  back to its list shows the change.
+- List tables rendered from the replica are cached apart from those
+  rendered from the primary, so a table read from a replica that was
+  behind a write (but after the write bumped the cache versions) is
+  never shown to the user who made it. They're kept for at most
+  DB_REPLICA_MAX_LAG seconds, so such a table isn't kept for long.
+
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA = "replica"
+LAST_WRITE_SESSION_KEY = "inventory_last_write"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replica_available():
+    return REPLICA in settings.DATABASES
+
+
+def may_read_replica(request):
+    """Whether request's reads can go to the replica."""
+    if not replica_available() or request.method not in ("GET", "HEAD"):
+        return False
+    last_write = request.session.get(LAST_WRITE_SESSION_KEY, 0)
+    return time.time() - last_write > settings.DB_REPLICA_MAX_LAG
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_available():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class RecentWriteMiddleware:
+    """Remember when each user last sent a request that may have
+    changed data."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.may_write(request):
+            request.session[LAST_WRITE_SESSION_KEY] = time.time()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.may_write(request):
+            await request.session.aset(LAST_WRITE_SESSION_KEY, time.time())
+        return await self.get_response(request)
+
+    def may_write(self, request):
+        return request.method not in ("GET", "HEAD", "OPTIONS", "TRACE") and hasattr(
+            request, "session"
+        )
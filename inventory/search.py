@@ -0,0 +1,311 @@
+"""Full-text search over sites, field notes and equipment.
+
+Each searchable item has a SearchDocument row holding its text:
+
+    Site        title: code and name      body: description
+    FieldNote   title: summary            body: note, site visitors
+    Equipment   title: instrument etc.    body: notes, history notes
+
+The receivers in inventory/signals.py rebuild an item's document when it
+(or one of its History entries) is saved or deleted. Run
+`manage.py rebuild_search_index` after bulk changes, which send no
+signals, and once after migration 0014 to index existing rows; code
+that makes bulk changes of its own calls index_objects() for the rows
+it changed.
+
+The index itself depends on the database:
+
+- MySQL: FULLTEXT indexes on the SearchDocument table, queried with
+  MATCH ... AGAINST in boolean mode.
+- SQLite: an external-content FTS5 table kept in step with
+  SearchDocument by triggers, ranked with bm25(). (SQLite rebuilds a
+  table to alter it, which drops the triggers: a migration that alters
+  SearchDocument must recreate them, see migration 0014.)
+
+Other databases fall back to an unranked icontains scan.
+
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Equipment, FieldNote, SearchDocument, Site
+
+FTS_TABLE = "inventory_searchdocument_fts"
+# bm25() weights of the title and body columns (SQLite)
+TITLE_WEIGHT = 4.0
+BODY_WEIGHT = 1.0
+# Words of context in a result snippet
+SNIPPET_WORDS = 16
+# Words shorter than this aren't in MySQL's index (innodb_ft_min_token_size)
+MYSQL_MIN_TOKEN_SIZE = 3
+# Marks matches in snippets until they're escaped and turned into <mark>
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+TERM_RE = re.compile(r"\w+")
+
+# URL names of the pages results link to
+EDIT_URL_NAMES = {
+    SearchDocument.SITE: "site_edit",
+    SearchDocument.FIELDNOTE: "fieldnote_edit",
+    SearchDocument.EQUIPMENT: "equipment_edit",
+}
+
+# ====== Documents ======
+
+
+def site_document(site):
+    return {
+        "label": f"{site.code}: {site.name}",
+        "title": f"{site.code} {site.name}",
+        "body": site.description,
+    }
+
+
+def fieldnote_label(site, date_visited):
+    return f"{site.code}: {site.name}, {date_visited}"
+
+
+def fieldnote_document(fieldnote):
+    return {
+        "label": fieldnote_label(fieldnote.site, fieldnote.date_visited),
+        "title": fieldnote.summary,
+        "body": "\n".join([fieldnote.note, fieldnote.site_visitors]),
+    }
+
+
+def equipment_document(equipment):
+    # all() so that rebuild_index()'s prefetch is used
+    history = sorted(equipment.history.all(), key=lambda entry: entry.date)
+    return {
+        "label": f"{equipment.instrument} - {equipment.serial_number}",
+        "title": " ".join(
+            [equipment.instrument, equipment.manufacturer, equipment.model_number]
+        ),
+        "body": "\n".join([equipment.notes, *(entry.note for entry in history)]),
+    }
+
+
+# Model -> (document kind, function returning the document's fields)
+DOCUMENT_BUILDERS = {
+    Site: (SearchDocument.SITE, site_document),
+    FieldNote: (SearchDocument.FIELDNOTE, fieldnote_document),
+    Equipment: (SearchDocument.EQUIPMENT, equipment_document),
+}
+
+
+def index_object(instance):
+    """Create or update instance's SearchDocument."""
+    kind, build = DOCUMENT_BUILDERS[type(instance)]
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk, defaults=build(instance)
+    )
+    if isinstance(instance, Site):
+        relabel_fieldnotes(instance)
+
+
+def relabel_fieldnotes(site):
+    """Field note labels name their site: bring those of site's field
+    notes up to date, in a few queries however many there are."""
+    dates = dict(site.fieldnotes.values_list("pk", "date_visited"))
+    documents = SearchDocument.objects.filter(
+        kind=SearchDocument.FIELDNOTE, object_id__in=site.fieldnotes.values("pk")
+    ).only("object_id", "label")
+    changed = []
+    for document in documents:
+        if document.object_id not in dates:
+            continue  # Added since dates was read, so already labelled
+        label = fieldnote_label(site, dates[document.object_id])
+        # Most saves don't rename the site
+        if document.label != label:
+            document.label = label
+            changed.append(document)
+    SearchDocument.objects.bulk_update(changed, ["label"], batch_size=500)
+
+
+def unindex_object(instance):
+    kind, _ = DOCUMENT_BUILDERS[type(instance)]
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def index_history(history):
+    """History notes are part of their equipment's document."""
+    equipment = Equipment.objects.filter(pk=history.item_id).first()
+    # None while the equipment itself is being deleted
+    if equipment is not None:
+        index_object(equipment)
+
+
+def index_querysets():
+    """The rows of each indexed model, with what their documents need."""
+    return {
+        Site: Site.objects.all(),
+        FieldNote: FieldNote.objects.select_related("site"),
+        Equipment: Equipment.objects.prefetch_related("history"),
+    }
+
+
+def build_documents(model, queryset, batch_size):
+    kind, build = DOCUMENT_BUILDERS[model]
+    return [
+        SearchDocument(kind=kind, object_id=instance.pk, **build(instance))
+        for instance in queryset.iterator(chunk_size=batch_size)
+    ]
+
+
+def index_objects(model, pks, batch_size=500):
+    """Replace the SearchDocuments of the model rows pks, a few queries
+    however many there are: for rows changed by bulk_create() or
+    update(), which send no signals. Returns the number indexed."""
+    kind, _ = DOCUMENT_BUILDERS[model]
+    pks = list(pks)
+    queryset = index_querysets()[model].filter(pk__in=pks)
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, object_id__in=pks).delete()
+        documents = build_documents(model, queryset, batch_size)
+        SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+    return len(documents)
+
+
+def rebuild_index(batch_size=500):
+    """Replace every SearchDocument. Returns the number indexed."""
+    SearchDocument.objects.all().delete()
+    count = 0
+    for model, queryset in index_querysets().items():
+        documents = build_documents(model, queryset, batch_size)
+        SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+        count += len(documents)
+    return count
+
+
+# ====== Searching ======
+
+
+def search_terms(query):
+    terms = TERM_RE.findall(query.lower())
+    if connection.vendor == "mysql":
+        terms = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN_SIZE]
+    return terms
+
+
+def search(query, kind=None, limit=None):
+    """Return the SearchDocuments matching every word of query, best
+    first, each with a score and a snippet_html showing the matches in
+    context.
+
+    kind restricts the results to one SearchDocument.KIND_CHOICES kind.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if limit is None:
+        limit = settings.SEARCH_RESULTS_LIMIT
+    if connection.vendor == "sqlite":
+        hits = search_sqlite(terms, kind, limit)
+    elif connection.vendor == "mysql":
+        hits = search_mysql(terms, kind, limit)
+    else:
+        hits = search_fallback(terms, kind, limit)
+    for hit in hits:
+        hit.snippet_html = highlight(hit.snippet)
+    return hits
+
+
+def search_sqlite(terms, kind, limit):
+    # Quoted so FTS5 query syntax in the input is taken literally;
+    # the * makes each a prefix search. Space separated terms must all
+    # match.
+    match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    params = [MATCH_START, MATCH_END, SNIPPET_WORDS, match]
+    kind_filter = ""
+    if kind:
+        kind_filter = "AND d.kind = %s"
+        params.append(kind)
+    params.append(limit)
+    return list(
+        SearchDocument.objects.raw(
+            f"""
+            SELECT d.id, d.kind, d.object_id, d.label,
+                   -bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score,
+                   snippet({FTS_TABLE}, -1, %s, %s, '…', %s) AS snippet
+            FROM {FTS_TABLE}
+            JOIN inventory_searchdocument d ON d.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s {kind_filter}
+            ORDER BY score DESC
+            LIMIT %s
+            """,
+            params,
+        )
+    )
+
+
+def search_mysql(terms, kind, limit):
+    # Boolean mode: + requires every term, * makes it a prefix search
+    against = " ".join(f"+{term}*" for term in terms)
+    params = [against, against, against]
+    kind_filter = ""
+    if kind:
+        kind_filter = "AND kind = %s"
+        params.append(kind)
+    params.append(limit)
+    hits = list(
+        SearchDocument.objects.raw(
+            f"""
+            SELECT id, kind, object_id, label, body,
+                   {TITLE_WEIGHT} * MATCH(title) AGAINST (%s IN BOOLEAN MODE)
+                   + MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM inventory_searchdocument
+            WHERE MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) {kind_filter}
+            ORDER BY score DESC
+            LIMIT %s
+            """,
+            params,
+        )
+    )
+    for hit in hits:
+        hit.snippet = make_snippet(hit.body, terms)
+    return hits
+
+
+def search_fallback(terms, kind, limit):
+    documents = SearchDocument.objects.all()
+    if kind:
+        documents = documents.filter(kind=kind)
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    hits = list(documents.order_by("kind", "label")[:limit])
+    for hit in hits:
+        hit.score = None
+        hit.snippet = make_snippet(hit.body, terms)
+    return hits
+
+
+def make_snippet(text, terms, length=SNIPPET_WORDS):
+    """A window of text around the first word matching terms, with the
+    matches marked as FTS5's snippet() marks them."""
+    pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")", re.IGNORECASE
+    )
+    words = text.split()
+    first = next((i for i, word in enumerate(words) if pattern.match(word)), 0)
+    start = max(0, first - length // 4)
+    window = [
+        f"{MATCH_START}{word}{MATCH_END}" if pattern.match(word) else word
+        for word in words[start : start + length]
+    ]
+    prefix = "… " if start else ""
+    suffix = " …" if start + length < len(words) else ""
+    return prefix + " ".join(window) + suffix
+
+
+def highlight(snippet):
+    """Escape a marked snippet and turn the marks into <mark> tags."""
+    html = escape(snippet or "")
+    html = html.replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+    return mark_safe(html)
@@ -5,21 +5,41 @@ from django.contrib.auth.signals import (
     user_login_failed,
     user_logged_out,
 )
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from . import blobs, counters, search
+from .cache import bump_version
+from .models import (
+    Equipment,
+    FieldNote,
+    History,
+    Photo,
+    PhotoDerivative,
+    PhotoUpload,
+    Site,
+)
+from .storage import delete_on_commit
+
 # Configure logger
 logger = logging.getLogger("inventory")
 
+# Models counted by the counter columns in inventory/counters.py
+COUNTED_MODELS = (FieldNote, Equipment, History, Photo)
+
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     """
     Log successful user login with relevant details
     """
-    # logger.info
+    ip = request.META.get("REMOTE_ADDR")
     logger.info(
-        f"Successful login: User {user.username} "
-        f"logged in from IP {request.META.get('REMOTE_ADDR')}."
+        "Successful login: User %s logged in from IP %s.",
+        user.username,
+        ip,
+        extra={"user": user.username, "action": "logged in", "ip": ip},
     )
 
 
@@ -28,8 +48,11 @@ def log_user_logout(sender, request, user, **kwargs):
     """
     Log successful user logout with relevant details
     """
-    # logger.info
-    logger.info(f"Successful logout: User {user.username}.")
+    logger.info(
+        "Successful logout: User %s.",
+        user,
+        extra={"user": str(user), "action": "logged out"},
+    )
 
 
 @receiver(user_login_failed)
@@ -37,5 +60,118 @@ def log_user_failed_login(sender, request, **kwargs):
     """
     Log failed user login with relevant details
     """
-    # logger.info
-    logger.debug(f"Failed login attempted from IP {request.META.get('REMOTE_ADDR')}.")
+    logger.debug(
+        "Failed login attempted from IP %s.",
+        request.META.get("REMOTE_ADDR"),
+        extra={"action": "login failed"},
+    )
+
+
+# ====== Counter columns ======
+
+
+def parents_unchanged(update_fields):
+    """True if a save with these update_fields can't move a row to
+    another parent."""
+    return update_fields is not None and not set(update_fields) & set(
+        counters.PARENT_FIELDS
+    )
+
+
+def remember_counted_parents(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Before an update, fetch the row as stored so post_save can tell
+    whether it moved to another parent."""
+    if parents_unchanged(update_fields):
+        return
+    if raw or instance._state.adding or instance.pk is None:
+        instance._counters_before = None
+        return
+    instance._counters_before = sender.objects.filter(pk=instance.pk).first()
+
+
+def update_counters_on_save(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    if raw or parents_unchanged(update_fields):
+        return
+    before = getattr(instance, "_counters_before", None)
+    if created or before is None:
+        counters.count_added(instance)
+    else:
+        counters.count_moved(before, instance)
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.count_removed(instance)
+
+
+for model in COUNTED_MODELS:
+    pre_save.connect(remember_counted_parents, sender=model)
+    post_save.connect(update_counters_on_save, sender=model)
+    post_delete.connect(update_counters_on_delete, sender=model)
+
+
+# ====== Photo files ======
+
+
+# Deleting a site or field note cascades to these, so this covers
+# SiteDeleteView and FieldNoteDeleteView too.
+
+
+@receiver(post_delete, sender=Photo)
+def delete_photo_file(sender, instance, **kwargs):
+    if instance.blob_id is None:
+        # Files from before the photo store have a uuid name of their own
+        delete_on_commit(instance.photo.storage, instance.photo.name)
+    else:
+        # Deleted if this was its last Photo (the counter update above
+        # has taken ref_count down)
+        blobs.collect_on_commit(instance.blob_id)
+
+
+@receiver(post_delete, sender=PhotoDerivative)
+def delete_derivative_file(sender, instance, **kwargs):
+    delete_on_commit(instance.file.storage, instance.file.name)
+
+
+@receiver(post_delete, sender=PhotoUpload)
+def delete_partial_upload(sender, instance, **kwargs):
+    if instance.partial:
+        delete_on_commit(default_storage, instance.file)
+
+
+# ====== Cache versions ======
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_cache_version(sender, **kwargs):
+    """Invalidate cached tables that show this model, see
+    inventory/cache.py."""
+    if sender._meta.app_label == "inventory":
+        bump_version(sender)
+
+
+# ====== Search index ======
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_save, sender=FieldNote)
+@receiver(post_save, sender=Equipment)
+def index_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_object(instance)
+
+
+@receiver(post_delete, sender=Site)
+@receiver(post_delete, sender=FieldNote)
+@receiver(post_delete, sender=Equipment)
+def unindex_on_delete(sender, instance, **kwargs):
+    search.unindex_object(instance)
+
+
+@receiver(post_save, sender=History)
+@receiver(post_delete, sender=History)
+def index_history(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_history(instance)
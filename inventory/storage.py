@@ -0,0 +1,95 @@
+"""Content-addressed storage for photo originals.
+
+BlobStorage, the storage of Photo.photo, names each file after the
+SHA-256 of its content, e.g.
+
+    photos/3f/a9/3fa9...e1.jpg
+
+The hash is computed while the file is copied into storage, so it is
+read only once. If a file of that name is already stored, the copy is
+thrown away instead of being moved into place: an SD card uploaded
+twice takes the space of one. The PhotoBlob rows of inventory/blobs.py
+count the Photos that share each file, and delete it once none do.
+
+Files stored before this keep their old names (site_photos/...); their
+Photos have no blob. `manage.py dedupe_photos` moves them in.
+
+Files of deleted rows are deleted by delete_on_commit(), called from
+post_delete receivers, once the deletion has committed. `manage.py
+check_media` finds any that were missed, and rows whose files are gone.
+
+"""
+
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = "photos"
+# Where files are written while they're hashed. Inside the storage so
+# that the final move is a rename on the same filesystem.
+TEMP_DIR = os.path.join(BLOB_DIR, "tmp")
+
+# Extensions that name the same format, so that equal content gets one
+# name whichever the camera or crew used
+EXTENSIONS = {".jpeg": ".jpg", ".jpe": ".jpg", ".tif": ".tiff"}
+
+
+def blob_name(digest, ext):
+    """Storage name of the content with this SHA-256 hex digest."""
+    ext = ext.lower()
+    ext = EXTENSIONS.get(ext, ext)
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], f"{digest}{ext}")
+
+
+def digest_of(name):
+    """The SHA-256 hex digest in a blob's storage name."""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    """FileSystemStorage that ignores the name it's given, apart from
+    its extension, and stores under the hash of the content."""
+
+    def get_available_name(self, name, max_length=None):
+        # Equal content is meant to get the same name
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        os.makedirs(self.path(TEMP_DIR), exist_ok=True)
+        temp_path = self.path(os.path.join(TEMP_DIR, f"{uuid.uuid4().hex}{ext}"))
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, "xb") as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = blob_name(digest.hexdigest(), ext)
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Atomic, so a reader never sees part of a file; two
+                # uploads of the same content just replace one another
+                os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+blob_storage = BlobStorage()
+
+
+def delete_on_commit(storage, name):
+    """Delete file name from storage once the current transaction
+    commits (straight away outside one), so that a rollback never
+    leaves a row without its file."""
+    if name:
+        transaction.on_commit(lambda: storage.delete(name))
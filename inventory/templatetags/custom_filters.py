@@ -9,6 +9,17 @@ def get_field_display(obj, field_name):
     return getattr(obj, field_name, "")
 
 
+@register.filter
+def table_value(obj, field):
+    """A SortedListMixin table cell: the excerpt of a long text column
+    that select_table_fields() cut short in SQL, if there is one, or
+    else the field's value."""
+    try:
+        return getattr(obj, f"{field['name']}_excerpt")
+    except AttributeError:
+        return getattr(obj, field["name"], "")
+
+
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key, "")
@@ -0,0 +1,51 @@
+from django import template
+from django.conf import settings
+
+from inventory.images import available_formats, mime_type
+
+register = template.Library()
+
+
+@register.inclusion_tag("inventory/include/photo_picture.html")
+def photo_picture(photo, kind="thumbnail", css_class="", alt=""):
+    """Render a <picture> for photo using its derivatives.
+
+    All sizes go into each format's srcset, and kind picks the size
+    used for the fallback src and the sizes hint. Photos without
+    derivatives yet fall back to the original file.
+
+    Use prefetch_related("...photos__derivatives") to avoid a query
+    per photo.
+    """
+    by_format = {}
+    for derivative in photo.derivatives.all():
+        by_format.setdefault(derivative.format, []).append(derivative)
+
+    context = {"photo": photo, "css_class": css_class, "alt": alt, "sources": []}
+    fallback = by_format.get("jpeg", [])
+    if not fallback:
+        context["src"] = photo.photo.url
+        return context
+
+    max_side = settings.PHOTO_DERIVATIVE_SIZES.get(kind)
+    # Browsers take the first <source> they support, so best first
+    for fmt in ("avif", "webp"):
+        if fmt not in available_formats() or fmt not in by_format:
+            continue
+        context["sources"].append(
+            {"type": mime_type(fmt), "srcset": _srcset(by_format[fmt])}
+        )
+    default = next((d for d in fallback if d.kind == kind), fallback[0])
+    context["src"] = default.file.url
+    context["srcset"] = _srcset(fallback)
+    context["width"] = default.width
+    context["height"] = default.height
+    if max_side:
+        context["sizes"] = f"(max-width: {max_side}px) 100vw, {max_side}px"
+    return context
+
+
+def _srcset(derivatives):
+    return ", ".join(
+        f"{d.file.url} {d.width}w" for d in sorted(derivatives, key=lambda d: d.width)
+    )
@@ -9,4 +9,19 @@ def querystring_without_sort(context):
     request = context["request"]
     querydict = request.GET.copy()
     querydict.pop("sort", None)
+    # A new sort order starts again from the first page
+    querydict.pop("page", None)
+    querydict.pop("cursor", None)
+    return querydict.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def querystring_replace(context, key, value):
+    """Return the current query string with key set to value. Page
+    and cursor parameters replace each other."""
+    request = context["request"]
+    querydict = request.GET.copy()
+    querydict.pop("page", None)
+    querydict.pop("cursor", None)
+    querydict[key] = value
     return querydict.urlencode()
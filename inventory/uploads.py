@@ -0,0 +1,174 @@
+"""Chunked, resumable photo uploads.
+
+The upload page sends each file as a series of PUT requests, each
+carrying the byte offset it starts at. Chunks are streamed from the
+request straight into a partial file under uploads/, a block at a
+time, so memory use per request is constant however big the file or
+the batch. When the last byte arrives the file is hashed into the
+photo store (inventory/blobs.py), where a copy of content already
+stored is dropped, and the Photo row is created and queued for
+processing like any other upload.
+
+The first bytes of a file are checked for an image format's signature
+before anything is written, and the whole header once the last chunk
+is in (check_image()); a file that fails is dropped with its upload.
+
+If a connection drops, whatever arrived is kept: the client asks for
+the current offset and carries on from there. Starting an upload of
+the same file name and size for the same fieldnote resumes the
+unfinished upload instead of beginning a new one. An upload isn't
+finished until its Photo exists: if storing the file fails after the
+last byte arrived, sending the (empty) rest of it again retries that.
+
+Chunks are written with plain file I/O, so this needs a default storage
+backend with local paths (FileSystemStorage). A hash can't be carried
+over from one request to the next, so the file is read once more at
+the end to hash it.
+
+"""
+
+import logging
+import os
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.timezone import now
+
+from . import blobs
+from .images import InvalidImage, check_format, check_image
+from .jobs import enqueue
+from .logs import log_action
+from .models import PhotoUpload
+from .storage import BLOB_DIR
+
+logger = logging.getLogger("inventory")
+
+# Bytes read from the request and written to disk at a time
+BLOCK_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """A chunk didn't start where the upload has got to."""
+
+
+def start_upload(fieldnote, user, filename, size, taken_by="", date_taken=None):
+    """Return the unfinished upload of this file, or start a new one."""
+    upload = (
+        # Still writing to its partial file. Not photo__isnull: the photo
+        # of a finished upload may have been deleted since (SET_NULL), and
+        # its file must be sent again
+        PhotoUpload.objects.filter(fieldnote=fieldnote, filename=filename, size=size)
+        .exclude(file__startswith=f"{BLOB_DIR}/")
+        .order_by("-created_at")
+        .first()
+    )
+    if upload is not None:
+        return upload
+
+    # Reserve a name with an empty file that chunks are added to
+    ext = os.path.splitext(filename)[1].lower()
+    name = default_storage.save(
+        os.path.join("uploads", f"{uuid.uuid4()}{ext}"), ContentFile(b"")
+    )
+    return PhotoUpload.objects.create(
+        fieldnote=fieldnote,
+        filename=filename,
+        size=size,
+        file=name,
+        taken_by=taken_by,
+        date_taken=date_taken,
+        uploaded_by=user,
+    )
+
+
+def append_chunk(upload, offset, stream, length):
+    """Copy length bytes from stream into upload's file at offset.
+
+    Keeps whatever arrived if the stream breaks off early, then
+    re-raises. Creates the Photo once the file is complete.
+    """
+    if offset != upload.received:
+        raise OffsetMismatch(
+            f"Chunk starts at byte {offset}, expected {upload.received}."
+        )
+    if offset + length > upload.size:
+        raise ValueError(f"Chunk runs past the end of the {upload.size} byte file.")
+
+    block = b""
+    if offset == 0:
+        # Turn away a file that isn't an image before storing any of it
+        block = stream.read(min(BLOCK_SIZE, length))
+        try:
+            check_format(block)
+        except InvalidImage as e:
+            upload.delete()
+            raise InvalidImage(f"'{upload.filename}' {e}")
+
+    written = 0
+    try:
+        with open(default_storage.path(upload.file), "r+b") as f:
+            f.seek(offset)
+            while written < length:
+                block = block or stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+                block = b""
+    finally:
+        # Only one request can move received on from offset
+        advanced = PhotoUpload.objects.filter(pk=upload.pk, received=offset).update(
+            received=offset + written, updated_at=now()
+        )
+    if not advanced:
+        upload.refresh_from_db()
+        raise OffsetMismatch(f"Another request already wrote from byte {offset}.")
+
+    upload.received = offset + written
+    if upload.received_all:
+        finish_upload(upload)
+    return upload
+
+
+def finish_upload(upload):
+    """Copy a completely received file into the photo store and create
+    its Photo.
+
+    The Photo and the upload's link to it are saved together, so if
+    anything fails the upload keeps its partial file and this can be
+    run again.
+    """
+    partial = upload.file
+    with default_storage.open(partial) as f:
+        try:
+            check_image(f)
+        except InvalidImage as e:
+            f.close()
+            upload.delete()
+            raise InvalidImage(f"'{upload.filename}' {e}")
+        name = blobs.store(f)
+        with transaction.atomic():
+            photo = blobs.create_photo(
+                name,
+                f,
+                fieldnote=upload.fieldnote,
+                taken_by=upload.taken_by,
+                date_taken=upload.date_taken,
+            )
+            upload.photo = photo
+            upload.file = name
+            upload.save(update_fields=["photo", "file", "updated_at"])
+            enqueue([photo])
+    default_storage.delete(partial)
+    if logger.isEnabledFor(logging.INFO):
+        # Only fetch the user if the line is logged
+        log_action(
+            upload.uploaded_by,
+            "uploaded",
+            photo,
+            fieldnote=upload.fieldnote_id,
+            file=upload.filename,
+        )
+    return photo
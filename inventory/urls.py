@@ -57,11 +57,35 @@ urlpatterns = [
         views.FieldNoteDeleteView.as_view(),
         name="fieldnote_delete",
     ),
+    path(
+        "fieldnotes/<int:pk>/photo-status/",
+        views.PhotoJobStatusView.as_view(),
+        name="fieldnote_photo_status",
+    ),
+    # Imports
+    path("import/", views.SpreadsheetImportView.as_view(), name="import"),
+    # Search
+    path("search/", views.SearchView.as_view(), name="search"),
     # Photos
     path("photos/", views.PhotoListView.as_view(), name="view_photos"),
+    path(
+        "photos/site/<int:pk>/",
+        views.SitePhotosView.as_view(),
+        name="site_photos",
+    ),
     path(
         "photos/add/<int:fieldnote>", views.PhotoUploadView.as_view(), name="photo_add"
     ),
+    path(
+        "photos/add/<int:fieldnote>/chunked/",
+        views.PhotoUploadStartView.as_view(),
+        name="photo_upload_start",
+    ),
+    path(
+        "photos/uploads/<uuid:pk>/",
+        views.PhotoUploadChunkView.as_view(),
+        name="photo_upload_chunk",
+    ),
     path(
         "photos/edit/<int:pk>",
         views.PhotoUpdateView.as_view(),
@@ -75,4 +99,6 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(
+        settings.MEDIA_URL, view=views.serve_media, document_root=settings.MEDIA_ROOT
+    )
@@ -1,9 +1,20 @@
 from pprint import pprint
-import logging
-from datetime import datetime
-
-from django.db.models import Case, When, CharField, Count, F, Value
-from django.db.models.functions import Lower, Concat
+from datetime import date, datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import Case, When, CharField, F, Q, Value
+from django.db.models.functions import Coalesce, Lower, Concat, Substr
+from django.http import (
+    Http404,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.generic.list import ListView
 from django.views.generic.edit import (
     UpdateView,
@@ -11,17 +22,50 @@ from django.views.generic.edit import (
     DeleteView,
     FormView,
 )
-from django.views.generic import TemplateView
-from django.shortcuts import redirect, render, get_object_or_404
+from django.views.generic import TemplateView, View
+from django.views.static import serve
+from django.shortcuts import redirect, render, get_object_or_404, aget_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.text import slugify
+from django.utils.timezone import make_aware
 from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.urls import reverse_lazy, reverse
-
-# from django.http import JsonResponse
-
-from inventory.models import Site, FieldNote, Equipment, Photo
+from django.conf import settings
+
+from inventory.models import (
+    DOI,
+    Site,
+    FieldNote,
+    Equipment,
+    History,
+    Photo,
+    PhotoJob,
+    PhotoUpload,
+    SearchDocument,
+)
+from . import blobs, search
+from .cache import get_cache, get_versions, list_cache_key, normalized_query
+from .conditional import latest_update, make_etag
+from .exports import EXPORT_FORMATS, available_export_formats
+from .imports import IMPORTERS, import_file
+from .jobs import enqueue
+from .logs import log_action
+from .metrics import timing_templates
+from .uploads import OffsetMismatch, append_chunk, finish_upload, start_upload
+from .routers import REPLICA, may_read_replica, replica_reads
+from .pagination import (
+    CURSOR_NEXT,
+    CURSOR_PREVIOUS,
+    CountlessPaginator,
+    InvalidCursor,
+    KeysetPage,
+    decode_cursor,
+    encode_cursor,
+)
 from .forms import (
     HistoryFormSet,
     PhotoUploadForm,
@@ -29,7 +73,10 @@ from .forms import (
     DOIFormSet,
     FieldNoteForm,
     EquipmentForm,
+    PhotoFilterForm,
     PhotoForm,
+    PhotoUploadStartForm,
+    SpreadsheetImportForm,
 )
 
 # This URL parameter tells us where to go after creating or editing an
@@ -37,8 +84,6 @@ from .forms import (
 SUCCESS_URL = "home"
 DEFAULT_MAX_CHARS = 50
 
-logger = logging.getLogger("inventory")
-
 # ====== View mixins ======
 
 
@@ -220,6 +265,63 @@ class UnderConstructionMixin:
         )(request, *args, **kwargs)
 
 
+class ConditionalGetMixin:
+    """Answer a GET with 304 Not Modified when the browser's copy of
+    the page is still current.
+
+    Subclasses provide get_last_modified(), the time the newest data
+    on the page changed (see inventory/conditional.py). It runs before
+    anything else, so it should cost no more than a query or two. The
+    ETag is derived from it unless get_etag() is overridden.
+    """
+
+    def get_last_modified(self):
+        return None
+
+    def get_etag(self, last_modified):
+        if last_modified is None:
+            return None
+        return make_etag(self.request, type(self).__name__, last_modified.isoformat())
+
+    def get(self, request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            # Messages are shown once, so render them
+            return super().get(request, *args, **kwargs)
+
+        last_modified = self.get_last_modified()
+        etag = self.get_etag(last_modified)
+        etag = quote_etag(etag) if etag else None
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag:
+            response.headers.setdefault("ETag", etag)
+        if timestamp:
+            response.headers.setdefault("Last-Modified", http_date(timestamp))
+        # Pages are per user, and must be revalidated on every visit
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """LoginRequiredMixin for views whose handlers are async.
+
+    It loads the user without blocking and puts it in request.user, so
+    that the templates' use of it doesn't query the database from the
+    event loop. Async views have the database queries they need run
+    before returning a TemplateResponse, which the handler renders in a
+    thread.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
 # ====== Equipment views ======
 
 
@@ -245,9 +347,7 @@ class EquipmentCreateView(LoginRequiredMixin, EquipmentViewsMixin, CreateView):
     def form_and_formset_valid(self, form, formset):
         # Store message before redirect
         response = super().form_and_formset_valid(form, formset)
-        logger.info(
-            f"User {self.request.user} successfully created equipment, {self.object.instrument}."
-        )
+        log_action(self.request.user, "created", self.object)
         return response
 
 
@@ -255,13 +355,12 @@ class EquipmentUpdateView(LoginRequiredMixin, EquipmentViewsMixin, UpdateView):
 
     action_text = "Edit"
     delete_url = "equipment_delete"
+    query_budget = 5
 
     def form_and_formset_valid(self, form, formset):
         # Store message before redirect
         response = super().form_and_formset_valid(form, formset)
-        logger.info(
-            f"User {self.request.user} successfully updated equipment, {self.object.instrument}."
-        )
+        log_action(self.request.user, "updated", self.object)
         return response
 
 
@@ -274,10 +373,9 @@ class EquipmentDeleteView(
 
     def form_valid(self, form):
         # Store message before redirect
+        pk = self.object.pk
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully deleted equipment, {self.object.instrument}."
-        )
+        log_action(self.request.user, "deleted", self.object, pk=pk)
         return response
 
     def get_success_message(self, cleaned_data):
@@ -301,7 +399,12 @@ class FieldNoteViewsMixin(URLsMixin, ContextMixin, SiteAssignmentMixin):
     def get_context_data(self, **kwargs):
         context = self.get_base_context_data(**kwargs)
         if isinstance(self, UpdateView):
-            context["photos"] = self.object.photos.all()
+            context["photos"] = self.object.photos.prefetch_related(
+                "derivatives", "jobs"
+            )
+            context["photo_status_url"] = reverse(
+                "fieldnote_photo_status", args=[self.object.id]
+            )
             context["success_url"] = f"?{SUCCESS_URL}={self.request.get_full_path()}"
             context["photo_add_url"] = (
                 reverse("photo_add", args=[context["object"].id])
@@ -324,21 +427,28 @@ class FieldNoteCreateView(LoginRequiredMixin, FieldNoteViewsMixin, CreateView):
             "Fieldnote created successfully. You can now add photos.",
         )
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully created fieldnote for site, {self.object.site}."
-        )
+        log_action(self.request.user, "created", self.object, site=self.object.site_id)
         return response
 
 
-class FieldNoteUpdateView(LoginRequiredMixin, FieldNoteViewsMixin, UpdateView):
+class FieldNoteUpdateView(
+    LoginRequiredMixin, ConditionalGetMixin, FieldNoteViewsMixin, UpdateView
+):
 
     action_text = "Edit"
+    query_budget = 10
+
+    def get_last_modified(self):
+        pk = self.kwargs["pk"]
+        return latest_update(
+            FieldNote.objects.filter(pk=pk),
+            Photo.objects.filter(fieldnote=pk),
+            Site.objects.filter(fieldnotes=pk),
+        )
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully updated fieldnote of {self.object.date_visited} for site {self.object.site}."
-        )
+        log_action(self.request.user, "updated", self.object, site=self.object.site_id)
         return response
 
 
@@ -352,9 +462,10 @@ class FieldNoteDeleteView(
     )
 
     def form_valid(self, form):
+        pk = self.object.pk
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully deleted fieldnote of {self.object.date_visited} for site {self.object.site}."
+        log_action(
+            self.request.user, "deleted", self.object, pk=pk, site=self.object.site_id
         )
         return response
 
@@ -397,9 +508,7 @@ class SiteCreateView(LoginRequiredMixin, SiteViewsMixin, CreateView):
             self.request,
             "Site created successfully. You can now add equipment and fieldnotes.",
         )
-        logger.info(
-            f"User {self.request.user} successfully created site, {self.object}."
-        )
+        log_action(self.request.user, "created", self.object)
         return response
 
     def get_success_url(self):
@@ -411,9 +520,21 @@ class SiteCreateView(LoginRequiredMixin, SiteViewsMixin, CreateView):
         return kwargs
 
 
-class SiteUpdateView(LoginRequiredMixin, SiteViewsMixin, UpdateView):
+class SiteUpdateView(
+    LoginRequiredMixin, ConditionalGetMixin, SiteViewsMixin, UpdateView
+):
 
     action_text = "Edit"
+    query_budget = 10
+
+    def get_last_modified(self):
+        pk = self.kwargs["pk"]
+        return latest_update(
+            Site.objects.filter(pk=pk),
+            DOI.objects.filter(site=pk),
+            FieldNote.objects.filter(site=pk),
+            Equipment.objects.filter(site=pk),
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -439,9 +560,7 @@ class SiteUpdateView(LoginRequiredMixin, SiteViewsMixin, UpdateView):
 
     def form_and_formset_valid(self, form, formset):
         response = super().form_and_formset_valid(form, formset)
-        logger.info(
-            f"User {self.request.user} successfully updated site, {self.object}."
-        )
+        log_action(self.request.user, "updated", self.object)
         return response
 
 
@@ -459,10 +578,9 @@ class SiteDeleteView(LoginRequiredMixin, SuccessMessageMixin, URLsMixin, DeleteV
 
     def form_valid(self, form):
         # Store message before redirect
+        pk = self.object.pk
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully deleted site, {self.object}."
-        )
+        log_action(self.request.user, "deleted", self.object, pk=pk)
         return response
 
     # Can eventually use this to protect agains deleting a location
@@ -483,7 +601,10 @@ class SiteDeleteView(LoginRequiredMixin, SuccessMessageMixin, URLsMixin, DeleteV
 # ====== Photo Views ======
 
 
-class PhotoUploadView(LoginRequiredMixin, URLsMixin, FormView):
+class PhotoUploadView(AsyncLoginRequiredMixin, URLsMixin, FormView):
+    """Upload several photos through a form. Async, so that writing
+    large files to storage doesn't hold a worker thread under ASGI."""
+
     template_name = "inventory/photo_upload.html"
     form_class = PhotoUploadForm
     default_success_url = reverse_lazy("view_fieldnotes")
@@ -494,9 +615,26 @@ class PhotoUploadView(LoginRequiredMixin, URLsMixin, FormView):
         kwargs["initial_date"] = date_taken
         return kwargs
 
-    def dispatch(self, request, *args, **kwargs):
-        self.fieldnote = get_object_or_404(FieldNote, pk=kwargs["fieldnote"])
-        return super().dispatch(request, *args, **kwargs)
+    async def load_fieldnote(self):
+        # In the handlers, not dispatch(), so that anonymous users are
+        # sent to log in before any lookup can tell them an id exists
+        self.fieldnote = await aget_object_or_404(
+            FieldNote.objects.select_related("site"), pk=self.kwargs["fieldnote"]
+        )
+
+    async def get(self, request, *args, **kwargs):
+        await self.load_fieldnote()
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        await self.load_fieldnote()
+        form = self.get_form()
+        if form.is_valid():
+            return await self.form_valid(form)
+        return self.form_invalid(form)
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -505,24 +643,36 @@ class PhotoUploadView(LoginRequiredMixin, URLsMixin, FormView):
 
         return context
 
-    def form_valid(self, form):
+    async def form_valid(self, form):
         taken_by = form.cleaned_data.get("taken_by", "")
         date_taken = form.cleaned_data["date_taken"]
         photos = form.cleaned_data["photos"]
         num_photos = len(photos)
 
-        for f in photos:
-            Photo.objects.create(
-                fieldnote=self.fieldnote,
-                photo=f,
-                taken_by=taken_by,
-                date_taken=date_taken,
-            )
-        logger.info(
-            f"User {self.request.user} uploaded {num_photos} photos taken at site {self.fieldnote.site} on {date_taken} by {taken_by}."
+        created = [
+            await self.save_photo(f, taken_by=taken_by, date_taken=date_taken)
+            for f in photos
+        ]
+        # Thumbnails etc. are built by the run_photo_jobs worker
+        await sync_to_async(enqueue)(created)
+        log_action(
+            self.request.user,
+            "uploaded",
+            Photo,
+            count=num_photos,
+            fieldnote=self.fieldnote.pk,
         )
 
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+    async def save_photo(self, file, **fields):
+        """Hash and write file to the photo store in a thread of its own,
+        off the one that async views share for database work, then
+        create its Photo. A file already stored isn't written again."""
+        name = await sync_to_async(blobs.store, thread_sensitive=False)(file)
+        return await sync_to_async(blobs.create_photo)(
+            name, file, fieldnote=self.fieldnote, **fields
+        )
 
     def form_invalid(self, form):
         print("Form invalid called")
@@ -532,6 +682,95 @@ class PhotoUploadView(LoginRequiredMixin, URLsMixin, FormView):
         return super().form_invalid(form)
 
 
+class ChunkedUploadMixin:
+    """Shared JSON responses for the chunked upload views."""
+
+    def upload_status(self, upload, status=200):
+        return JsonResponse(
+            {
+                "id": str(upload.id),
+                "url": reverse("photo_upload_chunk", args=[upload.id]),
+                "filename": upload.filename,
+                "size": upload.size,
+                "received": upload.received,
+                "complete": upload.complete,
+                "photo_id": upload.photo_id,
+                "chunk_size": settings.PHOTO_UPLOAD_CHUNK_SIZE,
+            },
+            status=status,
+        )
+
+
+class PhotoUploadStartView(LoginRequiredMixin, ChunkedUploadMixin, View):
+    """Start, or resume, a chunked upload of one photo for a fieldnote.
+    Responds with the upload's URL and how many bytes it already has."""
+
+    def post(self, request, *args, **kwargs):
+        fieldnote = get_object_or_404(FieldNote, pk=kwargs["fieldnote"])
+        form = PhotoUploadStartForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        upload = start_upload(
+            fieldnote,
+            request.user,
+            filename=form.cleaned_data["filename"],
+            size=form.cleaned_data["size"],
+            taken_by=form.cleaned_data["taken_by"],
+            date_taken=form.cleaned_data["date_taken"],
+        )
+        return self.upload_status(upload)
+
+
+class PhotoUploadChunkView(LoginRequiredMixin, ChunkedUploadMixin, View):
+    """GET reports an upload's progress. PUT appends the request body
+    at the byte offset given in the Upload-Offset header."""
+
+    def get(self, request, *args, **kwargs):
+        upload = get_object_or_404(PhotoUpload, pk=kwargs["pk"])
+        return self.upload_status(upload)
+
+    def put(self, request, *args, **kwargs):
+        upload = get_object_or_404(PhotoUpload, pk=kwargs["pk"])
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return JsonResponse(
+                {"error": "Upload-Offset and Content-Length headers are required."},
+                status=400,
+            )
+        if length > settings.PHOTO_UPLOAD_MAX_CHUNK_SIZE:
+            return JsonResponse({"error": "Chunk too large."}, status=413)
+        if upload.complete:
+            return self.upload_status(upload)
+
+        try:
+            if upload.received_all:
+                # Storing the file failed last time: try again
+                finish_upload(upload)
+            else:
+                # Read the body as a stream; never touch request.body
+                append_chunk(upload, offset, request, length)
+        except OffsetMismatch:
+            upload.refresh_from_db()
+            return self.upload_status(upload, status=409)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        return self.upload_status(upload)
+
+
+class PhotoJobStatusView(AsyncLoginRequiredMixin, View):
+    """JSON status of the processing jobs for a fieldnote's photos,
+    polled by the fieldnote page while uploads are being processed."""
+
+    async def get(self, request, *args, **kwargs):
+        fieldnote = await aget_object_or_404(FieldNote, pk=kwargs["pk"])
+        jobs = PhotoJob.objects.filter(photo__fieldnote=fieldnote).values(
+            "photo_id", "status", "attempts", "last_error"
+        )
+        return JsonResponse({"photos": [job async for job in jobs]})
+
+
 class PhotoUpdateView(LoginRequiredMixin, URLsMixin, ContextMixin, UpdateView):
 
     action_text = "Edit"
@@ -540,11 +779,15 @@ class PhotoUpdateView(LoginRequiredMixin, URLsMixin, ContextMixin, UpdateView):
     template_name = "inventory/photo_detail.html"
     default_success_url = reverse_lazy("view_photos")
     delete_url = "photo_delete"
+    query_budget = 4
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully updated a photo taken at {self.object.fieldnote.site} on {self.object.date_taken} by {self.object.taken_by}."
+        log_action(
+            self.request.user,
+            "updated",
+            self.object,
+            fieldnote=self.object.fieldnote_id,
         )
         return response
 
@@ -569,21 +812,26 @@ class PhotoDeleteView(LoginRequiredMixin, SuccessMessageMixin, URLsMixin, Delete
     default_success_url = reverse_lazy("view_photos")
     success_message = "Photo of %(date)s for site %(site)s was deleted successfully!"
 
+    def get_queryset(self):
+        # The success message names the site
+        return Photo.objects.select_related("fieldnote__site")
+
     def form_valid(self, form):
+        pk = self.object.pk
         response = super().form_valid(form)
-        logger.info(
-            f"User {self.request.user} successfully deleted a photo taken at {self.object.fieldnote.site} on {self.object.date_taken} by {self.object.taken_by}."
+        log_action(
+            self.request.user,
+            "deleted",
+            self.object,
+            pk=pk,
+            fieldnote=self.object.fieldnote_id,
         )
         return response
 
     def get_success_message(self, cleaned_data):
         return self.success_message % dict(
             cleaned_data,
-            date=(
-                self.object.date_taken
-                if self.object.date_taken
-                else self.object.fieldnote.date_visited
-            ),
+            date=self.object.capture_date,
             site=self.object.fieldnote.site,
         )
 
@@ -591,7 +839,7 @@ class PhotoDeleteView(LoginRequiredMixin, SuccessMessageMixin, URLsMixin, Delete
 # ====== List Mixins ======
 
 
-class SortedListMixin(ListView):
+class SortedListMixin(ConditionalGetMixin, ListView):
     """Add persistent sort machinery to ListView.
 
     Pass a table_fields list of dicts for the template via the context
@@ -606,10 +854,63 @@ class SortedListMixin(ListView):
     use extra keys for more control:
     - "sortable": if "no", don't offer sort arrows on the column header.
     - "max_chars": truncate the data to max_chars number of characters.
+    - "related": a relation to join into the list query (select_related),
+      for a column showing a related object, eg "site".
+    - "only": the columns displaying the field reads besides its own,
+      eg ["site__code", "site__name"] for a Site's __str__.
+    - "sort_by": the lookup path to sort the column on, if not its
+      name, eg "site__code" for a ForeignKey to Site.
+
+    The list query loads only the table's columns and those declared
+    with "only" (see select_table_fields()), so a column reading
+    anything else costs a query per row: declare it. Text columns that
+    may be longer than max_chars are cut short in SQL; make long text
+    annotations with alias() rather than annotate() so that only the
+    cut down version is selected.
+
+    Pagination is controlled by two class attributes:
+    - pagination_mode: "offset" (the default) uses Django's Paginator
+      and ?page=N. "keyset" seeks from an opaque ?cursor= built from
+      the current sort key plus the pk, so page N costs the same as
+      page 1.
+    - count_total: if False, offset pagination skips the COUNT(*)
+      query for the total number of rows. Keyset pagination never
+      counts.
+
+    ?export=csv (or xlsx, parquet) downloads the whole table, with the
+    current filters and sort, as a streamed file (see
+    inventory/exports.py).
+
+    The table and its pagination are rendered from table_template_name
+    and cached (see inventory/cache.py) if cache_models lists the
+    models whose changes should invalidate it. A cache hit skips the
+    list queries altogether. The same models' timestamps and cache
+    versions answer conditional GETs.
+
+    If there's a read replica, the list is read from it (see
+    inventory/routers.py).
     """
 
     lookup_default = "icontains"
-    # Default maximum field width
+    pagination_mode = "offset"
+    count_total = True
+    cursor_kwarg = "cursor"
+    export_kwarg = "export"
+    table_template_name = "inventory/include/list_table.html"
+    cache_models = ()
+    # Most SQL queries a request should take (inventory/metrics.py),
+    # however many rows the page shows
+    query_budget = None
+    table_html = None
+    table_cache_key = None
+    cache_versions = None
+    reading_replica = False
+    # Set by apply_sort_parameters()
+    _sort_expression = None
+    _sort_is_text = False
+    _sort_nullable = False
+    _sort_field = models.CharField()
+    _sort_descending = False
 
     def apply_filters(self, queryset):
         for field_filter in self.filter_fields:
@@ -632,19 +933,363 @@ class SortedListMixin(ListView):
         return queryset
 
     def apply_sort_parameters(self, queryset):
+        field_list = [field["name"] for field in self.table_fields]
         sort = self.request.GET.get("sort", self._sort_key)
+        if sort.lstrip("-") not in field_list:
+            sort = type(self)._sort_key
         self._sort_key = sort
+        if sort.lstrip("-") not in field_list:
+            return queryset
 
-        field_list = [field["name"] for field in self.table_fields]
-        if sort.lstrip("-") in field_list:
-            if sort.startswith("-"):
-                print(f"BB-de: {sort}, {sort[1:]}")
-                queryset = queryset.order_by(Lower(sort[1:]).desc())
+        self._sort_expression, self._sort_is_text = self.get_sort_expression(
+            queryset, sort.lstrip("-")
+        )
+        self._sort_field = self.get_sort_field(queryset, sort.lstrip("-"))
+        self._sort_nullable = self.sort_is_nullable(queryset, sort.lstrip("-"))
+        self._sort_descending = sort.startswith("-")
+        # The pk breaks ties, so that rows with equal keys don't move
+        # between pages
+        if self._sort_descending:
+            return queryset.order_by(self._sort_expression.desc(), "-pk")
+        return queryset.order_by(self._sort_expression.asc(), "pk")
+
+    def get_sort_expression(self, queryset, name):
+        """Return the expression to sort on for table field name, and
+        whether it's text.
+
+        Text sorts case-insensitively, on Lower(), which the models give
+        functional indexes where it matters. Anything else (dates,
+        numbers, foreign keys) sorts on the plain column, which an
+        ordinary index serves, and numbers sort as numbers.
+        """
+        field = next(field for field in self.table_fields if field["name"] == name)
+        path = field.get("sort_by", name)
+        if isinstance(
+            self.get_sort_field(queryset, name), (models.CharField, models.TextField)
+        ):
+            return Lower(path), True
+        return F(path), False
+
+    def get_sort_field(self, queryset, name):
+        """The model (or output) field of table field name's sort key."""
+        field = next(field for field in self.table_fields if field["name"] == name)
+        path = field.get("sort_by", name)
+        if path in queryset.query.annotations:
+            return queryset.query.annotations[path].output_field
+        return self.get_model_field(path)
+
+    def sort_is_nullable(self, queryset, name):
+        """Whether table field name's sort key can be NULL: an
+        annotation, a nullable column, or one reached through a nullable
+        foreign key."""
+        field = next(field for field in self.table_fields if field["name"] == name)
+        path = field.get("sort_by", name)
+        if path in queryset.query.annotations:
+            return True
+        model = self.model
+        for name in path.split("__"):
+            field = model._meta.get_field(name)
+            if field.null:
+                return True
+            model = field.related_model
+        return False
+
+    def get_model_field(self, path):
+        """The model field at the end of a lookup path like site__code."""
+        model = self.model
+        for name in path.split("__"):
+            field = model._meta.get_field(name)
+            model = field.related_model
+        return field
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(self.export_kwarg)
+        if export_format in available_export_formats():
+            return self.export(export_format)
+        self.reading_replica = may_read_replica(request)
+        if self.reading_replica:
+            with replica_reads():
+                return self.get_list(request, *args, **kwargs)
+        return self.get_list(request, *args, **kwargs)
+
+    def get_list(self, request, *args, **kwargs):
+        if self.cache_models:
+            self.cache_versions = get_versions(self.cache_models)
+        if self.cache_models and settings.INVENTORY_LIST_CACHE_TIMEOUT:
+            self.table_cache_key = list_cache_key(
+                type(self).__name__,
+                request.GET,
+                self.cache_versions,
+                REPLICA if self.reading_replica else DEFAULT_DB_ALIAS,
+            )
+            self.table_html = get_cache().get(self.table_cache_key)
+        return super().get(request, *args, **kwargs)
+
+    def select_table_fields(self, queryset, excerpts=True):
+        """Join the relations table_fields declare and load only the
+        columns the table shows, so that a page takes the same number of
+        queries however many rows it has.
+
+        With excerpts, text longer than a column's max_chars is cut
+        short in SQL, to one character more than max_chars so that
+        truncatechars still knows to add an ellipsis, and selected as
+        <name>_excerpt instead of the whole column.
+        """
+        related = []
+        columns = ["pk"]
+        annotations = {}
+        for field in self.table_fields:
+            name = field["name"]
+            if "related" in field:
+                related.append(field["related"])
+            columns.extend(field.get("only", []))
+            if name in queryset.query.annotations:
+                output_field = queryset.query.annotations[name].output_field
             else:
-                print(f"BB-as: {sort}")
-                queryset = queryset.order_by(Lower(sort))
+                try:
+                    output_field = self.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    continue  # Not a database column
+            # An annotate()d column is selected whole anyway
+            selected = name in queryset.query.annotation_select
+            long_text = self.is_long_text(output_field, field.get("max_chars"))
+            if excerpts and long_text and not selected:
+                annotations[f"{name}_excerpt"] = Substr(name, 1, field["max_chars"] + 1)
+            elif name not in queryset.query.annotations:
+                columns.append(name)
+            elif not selected:
+                annotations[name] = F(name)  # Select an alias()
+        return queryset.select_related(*related).only(*columns).annotate(**annotations)
+
+    @staticmethod
+    def is_long_text(output_field, max_chars):
+        return (
+            max_chars is not None
+            and isinstance(output_field, (models.CharField, models.TextField))
+            and (output_field.max_length is None or output_field.max_length > max_chars)
+        )
 
-        return queryset
+    # ====== Export ======
+
+    def get_export_queryset(self):
+        return self.select_table_fields(self.get_queryset(), excerpts=False)
+
+    def iter_export_rows(self, queryset, batch_size):
+        """Yield every row of queryset as a list of table_fields values.
+
+        Rows are read batch_size at a time, each batch seeking on the
+        sort key from the last row of the one before: MySQLdb reads a
+        whole result set into memory, so a single iterator() query
+        wouldn't keep memory flat.
+        """
+        names = [field["name"] for field in self.table_fields]
+        after = None
+        while True:
+            batch = list(
+                self.keyset_queryset(queryset, after, self._sort_descending)[
+                    :batch_size
+                ]
+            )
+            for item in batch:
+                values = [getattr(item, name, None) for name in names]
+                yield [
+                    str(value) if isinstance(value, models.Model) else value
+                    for value in values
+                ]
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1].keyset_value, batch[-1].pk)
+
+    def get_export_fields(self, queryset):
+        """The model (or output) field of each table field, or None if
+        it isn't a database column."""
+        fields = []
+        for field in self.table_fields:
+            name = field["name"]
+            if name in queryset.query.annotations:
+                fields.append(queryset.query.annotations[name].output_field)
+                continue
+            try:
+                fields.append(self.model._meta.get_field(name))
+            except FieldDoesNotExist:
+                fields.append(None)
+        return fields
+
+    def export(self, export_format):
+        """Stream the whole table, as filtered and sorted on the page,
+        as a file download."""
+        writer, content_type, extension = EXPORT_FORMATS[export_format]
+        batch_size = settings.EXPORT_BATCH_SIZE
+        queryset = self.get_export_queryset()
+        rows = self.iter_export_rows(queryset, batch_size)
+        header = [field["label"] for field in self.table_fields]
+        fields = self.get_export_fields(queryset)
+        response = StreamingHttpResponse(
+            writer(header, rows, batch_size, fields=fields), content_type=content_type
+        )
+        filename = f"{slugify(self.model._meta.verbose_name_plural)}-{date.today()}"
+        response["Content-Disposition"] = (
+            f'attachment; filename="{filename}.{extension}"'
+        )
+        log_action(
+            self.request.user, "exported", self.model, export_format=export_format
+        )
+        return response
+
+    def get_last_modified(self):
+        if not self.cache_models:
+            return None
+        return latest_update(*(model.objects.all() for model in self.cache_models))
+
+    def get_etag(self, last_modified):
+        if not self.cache_models:
+            return None
+        # The versions change on deletes too, which timestamps can't show
+        return make_etag(
+            self.request,
+            normalized_query(self.request.GET),
+            self.cache_versions,
+            last_modified,
+        )
+
+    def get_paginate_by(self, queryset):
+        if self.table_html is not None:
+            return None  # Rows come from the cached table
+        return super().get_paginate_by(queryset)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        if not self.count_total:
+            return CountlessPaginator(queryset, per_page, **kwargs)
+        return super().get_paginator(queryset, per_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        queryset = self.select_table_fields(queryset)
+        if self.pagination_mode != "keyset":
+            return super().paginate_queryset(queryset, page_size)
+        page = self.paginate_keyset(queryset, page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def keyset_queryset(self, queryset, after=None, reverse=False):
+        """Annotate queryset with keyset_value, order it by (sort key,
+        pk) and, if after is a (keyset_value, pk) pair, start from the
+        row following it."""
+        if self._sort_expression is None:
+            key = Value("", output_field=CharField())
+        elif self._sort_is_text and self._sort_nullable:
+            # Rows with a NULL key would drop out of the comparisons
+            # below. No index covers this, so it's only for columns that
+            # can be NULL.
+            key = Coalesce(self._sort_expression, Value(""), output_field=CharField())
+        else:
+            # The bare Lower(column) of text keys is what the models'
+            # functional indexes cover. Keyset lists mustn't sort on
+            # nullable non-text columns.
+            key = self._sort_expression
+        queryset = queryset.annotate(keyset_value=key)
+        if after is not None:
+            value, pk = after
+            beyond = "lt" if reverse else "gt"
+            # The first condition adds nothing logically, but is a range
+            # the sort key's index can seek to; planners won't seek on
+            # the OR alone, and scan from the first row instead
+            queryset = queryset.filter(
+                Q(**{f"keyset_value__{beyond}e": value}),
+                Q(**{f"keyset_value__{beyond}": value})
+                | Q(keyset_value=value, **{f"pk__{beyond}": pk}),
+            )
+        prefix = "-" if reverse else ""
+        return queryset.order_by(f"{prefix}keyset_value", f"{prefix}pk")
+
+    def keyset_page_queryset(self, queryset, cursor, page_size):
+        """The query for the page after (or before) cursor, a decoded
+        cursor or None for the first page. It fetches one row more than
+        page_size, to tell whether there's another page."""
+        backwards = cursor is not None and cursor[2] == CURSOR_PREVIOUS
+        # Walking back to the previous page is walking forwards through
+        # the reversed ordering.
+        queryset = self.keyset_queryset(
+            queryset,
+            after=cursor[:2] if cursor is not None else None,
+            reverse=self._sort_descending != backwards,
+        )
+        return queryset[: page_size + 1]
+
+    def paginate_keyset(self, queryset, page_size):
+        """Return the KeysetPage selected by the cursor in the URL.
+
+        Rows are ordered by (sort key, pk) and the cursor holds that
+        pair for the last (or first) row of the page it came from, so
+        the next page is a WHERE on those two values instead of an
+        OFFSET.
+        """
+        raw_cursor = self.request.GET.get(self.cursor_kwarg, "")
+        try:
+            cursor = (
+                decode_cursor(
+                    raw_cursor,
+                    self._sort_field,
+                    # Text keys are coalesced, see keyset_queryset()
+                    nullable=self._sort_nullable and not self._sort_is_text,
+                )
+                if raw_cursor
+                else None
+            )
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        backwards = cursor is not None and cursor[2] == CURSOR_PREVIOUS
+        rows = list(self.keyset_page_queryset(queryset, cursor, page_size))
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        # Coming back from a later page means there is a next one, and
+        # any forward cursor means there is a previous one.
+        has_next = True if backwards else more
+        has_previous = more if backwards else cursor is not None
+        first, last = rows[0], rows[-1]
+        return KeysetPage(
+            rows,
+            next_cursor=(
+                encode_cursor(last.keyset_value, last.pk, CURSOR_NEXT)
+                if has_next
+                else None
+            ),
+            previous_cursor=(
+                encode_cursor(first.keyset_value, first.pk, CURSOR_PREVIOUS)
+                if has_previous
+                else None
+            ),
+        )
+
+    def get_context_data(self, **kwargs):
+        if self.table_html is not None:
+            kwargs["object_list"] = self.object_list.none()
+        context = super().get_context_data(**kwargs)
+        context["pagination_mode"] = self.pagination_mode
+        context["cursor_kwarg"] = self.cursor_kwarg
+        context["count_total"] = self.count_total
+        context["export_kwarg"] = self.export_kwarg
+        context["export_formats"] = available_export_formats()
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.table_html is None:
+            with timing_templates(self.request):
+                self.table_html = render_to_string(
+                    self.table_template_name, context, self.request
+                )
+            if self.table_cache_key:
+                timeout = settings.INVENTORY_LIST_CACHE_TIMEOUT
+                if self.reading_replica:
+                    # It may be behind the cache versions (see
+                    # inventory/routers.py)
+                    timeout = min(timeout, settings.DB_REPLICA_MAX_LAG)
+                get_cache().set(self.table_cache_key, self.table_html, timeout)
+        context["table_html"] = mark_safe(self.table_html)
+        return super().render_to_response(context, **response_kwargs)
 
 
 # ====== List Views ======
@@ -656,6 +1301,8 @@ class SiteListView(LoginRequiredMixin, SortedListMixin):
     template_name = "inventory/lists.html"
 
     context_object_name = "table_items"
+    cache_models = (Site, FieldNote, Equipment, Photo)
+    query_budget = 8
     # Default sort order
     _sort_key = "code"
 
@@ -710,16 +1357,18 @@ class SiteListView(LoginRequiredMixin, SortedListMixin):
             "max_chars": DEFAULT_MAX_CHARS,
             "sortable": "yes",
         },
-        # {"name": "photo_count", "label": "Photos", "sortable": ""},
+        {
+            "name": "photo_count",
+            "label": "Photos",
+            "max_chars": DEFAULT_MAX_CHARS,
+            "sortable": "yes",
+        },
     ]
 
     def get_queryset(self):
-        # See https://docs.djangoproject.com/en/5.2/topics/db/aggregation/,
-        # "Combining multiple aggregations" for caveats re annotate().
+        # fieldnotes_count, equipment_count and photo_count are counter
+        # columns (see inventory/counters.py), so no JOINs needed here.
         qs = Site.objects.annotate(
-            fieldnotes_count=Count("fieldnotes", distinct=True),
-            equipment_count=Count("equipment", distinct=True),
-            # photo_count=Count("photos", distinct=True),
             dates_active=Concat(
                 F("date_activated"),
                 Value(" - "),
@@ -758,6 +1407,8 @@ class EquipmentListView(LoginRequiredMixin, SortedListMixin):
     template_name = "inventory/lists.html"
     paginate_by = 14
     context_object_name = "table_items"
+    cache_models = (Equipment, History, Site)
+    query_budget = 7
     # Default sort order
     _sort_key = "instrument"
 
@@ -806,6 +1457,9 @@ class EquipmentListView(LoginRequiredMixin, SortedListMixin):
             "label": "Location",
             "max_chars": DEFAULT_MAX_CHARS,
             "sortable": "yes",
+            "related": "site",
+            "only": ["site__code", "site__name"],
+            "sort_by": "site__code",
         },
         {"name": "notes", "label": "Notes", "max_chars": 80, "sortable": "no"},
         {
@@ -818,7 +1472,6 @@ class EquipmentListView(LoginRequiredMixin, SortedListMixin):
 
     def get_queryset(self):
         qs = Equipment.objects.all()
-        qs = qs.annotate(history_count=Count("history"))
 
         qs = self.apply_filters(qs)
         qs = self.apply_sort_parameters(qs)
@@ -843,8 +1496,12 @@ class EquipmentListView(LoginRequiredMixin, SortedListMixin):
 class FieldNoteListView(LoginRequiredMixin, SortedListMixin):
     model = FieldNote
     paginate_by = 14
+    # Years of field notes: seek instead of OFFSET for deep pages
+    pagination_mode = "keyset"
     template_name = "inventory/lists.html"
     context_object_name = "table_items"
+    cache_models = (FieldNote, Photo, Site)
+    query_budget = 6
     # Default sort order
     _sort_key = "date_visited"
     filter_fields = [
@@ -865,6 +1522,9 @@ class FieldNoteListView(LoginRequiredMixin, SortedListMixin):
             "label": "Site",
             "max_chars": DEFAULT_MAX_CHARS,
             "sortable": "no",
+            "related": "site",
+            "only": ["site__code", "site__name"],
+            "sort_by": "site__code",
         },
         {
             "name": "display_summary",
@@ -887,13 +1547,14 @@ class FieldNoteListView(LoginRequiredMixin, SortedListMixin):
     ]
 
     def get_queryset(self):
-        qs = FieldNote.objects.annotate(
+        # An alias: select_table_fields() selects it, cut short
+        qs = FieldNote.objects.alias(
             display_summary=Case(
                 When(summary__isnull=False, summary__gt="", then="summary"),
                 default="note",
                 output_field=CharField(),
             )
-        ).annotate(photo_count=Count("photos"))
+        )
         qs = self.apply_filters(qs)
         qs = self.apply_sort_parameters(qs)
 
@@ -913,21 +1574,179 @@ class FieldNoteListView(LoginRequiredMixin, SortedListMixin):
         return context
 
 
-class PhotoListView(LoginRequiredMixin, ListView):
-    model = Site
+class PhotoListView(AsyncLoginRequiredMixin, TemplateView):
+    """The Photo Library: one collapsed accordion panel per site. Only
+    the headers are rendered here; each panel fetches its photos from
+    SitePhotosView when it is first opened."""
+
     template_name = "inventory/photo_list.html"
-    context_object_name = "sites"
+    query_budget = 3
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    def get_queryset(self):
+        return Site.objects.only("id", "name", "photo_count").order_by("name")
 
-        return context
+    async def get(self, request, *args, **kwargs):
+        sites = [site async for site in self.get_queryset().aiterator()]
+        return self.render_to_response(self.get_context_data(sites=sites))
+
+
+def start_of_day(day):
+    """The aware datetime at which day begins in the current time zone."""
+    return make_aware(datetime.combine(day, time.min))
+
+
+class SitePhotosView(AsyncLoginRequiredMixin, TemplateView):
+    """One page of a site's photos, grouped by field note, as an HTML
+    fragment for a Photo Library accordion panel."""
+
+    template_name = "inventory/include/site_photos.html"
+    paginate_by = 24
+    query_budget = 6
+
+    def get_queryset(self):
+        queryset = (
+            Photo.objects.filter(fieldnote__site=self.site)
+            .select_related("fieldnote")
+            .prefetch_related("derivatives")
+        )
+        # An invalid filter is reported in the form and left out
+        filters = self.form.cleaned_data
+        if filters.get("taken_from"):
+            queryset = queryset.filter(
+                taken_at__gte=start_of_day(filters["taken_from"])
+            )
+        if filters.get("taken_to"):
+            queryset = queryset.filter(
+                taken_at__lt=start_of_day(filters["taken_to"] + timedelta(days=1))
+            )
+        if filters.get("located"):
+            queryset = queryset.filter(latitude__isnull=False)
+        if filters.get("bbox"):
+            south, west, north, east = filters["bbox"]
+            queryset = queryset.filter(latitude__range=(south, north))
+            if west <= east:
+                queryset = queryset.filter(longitude__range=(west, east))
+            else:
+                # Across the antimeridian
+                queryset = queryset.filter(
+                    Q(longitude__gte=west) | Q(longitude__lte=east)
+                )
+
+        sort = filters.get("sort") or "visit"
+        if sort == "visit":
+            return queryset.order_by("fieldnote__date_visited", "fieldnote_id", "pk")
+        # Photos without a capture time (no EXIF) last either way
+        if sort == "taken":
+            return queryset.order_by(F("taken_at").asc(nulls_last=True), "pk")
+        return queryset.order_by(F("taken_at").desc(nulls_last=True), "-pk")
+
+    async def get(self, request, *args, **kwargs):
+        self.site = await aget_object_or_404(Site, pk=kwargs["pk"])
+        self.form = PhotoFilterForm(request.GET)
+        self.form.is_valid()
+        queryset = self.get_queryset()
+        paginator = Paginator(queryset, self.paginate_by)
+        # Counted here, as Paginator would count synchronously
+        paginator.count = await queryset.acount()
+        try:
+            page = paginator.page(request.GET.get("page") or 1)
+        except InvalidPage:
+            raise Http404("Invalid page.")
+        page.object_list = [photo async for photo in page.object_list]
+        return self.render_to_response(
+            self.get_context_data(
+                site=self.site,
+                form=self.form,
+                group_by_visit=self.form.cleaned_data.get("sort")
+                in ("", None, "visit"),
+                photos=page.object_list,
+                page_obj=page,
+                paginator=paginator,
+                is_paginated=page.has_other_pages(),
+            )
+        )
+
+
+# ====== Imports ======
+
+
+class SpreadsheetImportView(LoginRequiredMixin, FormView):
+    """Bulk import from a spreadsheet upload, see inventory/imports.py.
+    The same work as `manage.py import_spreadsheet`, with the per-row
+    error report shown on the page."""
+
+    form_class = SpreadsheetImportForm
+    template_name = "inventory/import.html"
+
+    def form_valid(self, form):
+        kind = form.cleaned_data["kind"]
+        file = form.cleaned_data["file"]
+        dry_run = form.cleaned_data["dry_run"]
+        try:
+            result = import_file(kind, file, file.name, dry_run=dry_run)
+        except ValueError as e:
+            form.add_error("file", f"Could not read {file.name}: {e}")
+            return self.form_invalid(form)
+        if not dry_run:
+            log_action(
+                self.request.user,
+                "imported",
+                IMPORTERS[kind].model,
+                count=result.created,
+                file=file.name,
+            )
+        return self.render_to_response(
+            self.get_context_data(form=form, result=result, dry_run=dry_run)
+        )
+
+
+# ====== Search ======
+
+
+class SearchView(LoginRequiredMixin, ListView):
+    """Ranked full-text search over sites, field notes and equipment,
+    see inventory/search.py."""
+
+    template_name = "inventory/search.html"
+    context_object_name = "hits"
+    paginate_by = 25
+    query_budget = 3
 
     def get_queryset(self):
-        return Site.objects.prefetch_related("fieldnotes__photos").order_by(
-            "name"
-        )  # optional, for consistency
+        self.query = self.request.GET.get("q", "").strip()
+        self.kind = self.request.GET.get("kind", "")
+        if self.kind not in search.EDIT_URL_NAMES:
+            self.kind = ""
+        hits = search.search(self.query, kind=self.kind or None)
+        for hit in hits:
+            hit.url = reverse(search.EDIT_URL_NAMES[hit.kind], args=[hit.object_id])
+        return hits
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["search_query"] = self.query
+        context["kind"] = self.kind
+        context["kinds"] = SearchDocument.KIND_CHOICES
+        context["heading"] = "Search"
+        return context
 
 
 def logout_view(request):
     logout(request)
+
+
+# ====== Media ======
+
+
+def serve_media(request, path, document_root=None):
+    """Serve MEDIA_ROOT when DEBUG is on, with the caching headers
+    Apache sends in production (see Project_resources/ecoflux.conf).
+
+    Photos and derivatives are saved under random names that are never
+    reused, so a URL's content never changes and browsers can keep it.
+    """
+    response = serve(request, path, document_root=document_root)
+    patch_cache_control(
+        response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True
+    )
+    return response
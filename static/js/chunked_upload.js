@@ -0,0 +1,87 @@
+// Resumable, chunked photo uploads for the photo upload page.
+//
+// Each selected file is sent in PHOTO_UPLOAD_CHUNK_SIZE pieces with PUT
+// requests. If a request fails, we ask the server how much it has and
+// carry on from there, so a dropped connection costs at most one chunk.
+// Without fetch/Blob.slice the form falls back to a normal multipart POST.
+document.addEventListener('DOMContentLoaded', function () {
+  const form = document.querySelector('form[data-chunked-start-url]');
+  if (!form || !window.fetch || !Blob.prototype.slice) return;
+
+  const fileInput = document.getElementById('id_photos');
+  const preview = document.getElementById('preview');
+  const maxRetries = 8;
+  const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+
+  function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+  }
+
+  async function request(url, options = {}) {
+    options.headers = Object.assign({ 'X-CSRFToken': csrfToken }, options.headers);
+    const response = await fetch(url, options);
+    const data = await response.json();
+    // 409: the server has a different offset than we sent; data says
+    // where to resume.
+    if (response.ok || response.status === 409) return data;
+    const error = new Error(data.error || JSON.stringify(data.errors) || response.statusText);
+    error.fatal = response.status < 500;
+    throw error;
+  }
+
+  function progressBar(file) {
+    const bar = document.createElement('div');
+    bar.className = 'progress mt-1';
+    bar.innerHTML = '<div class="progress-bar" role="progressbar" style="width: 0%"></div>';
+    bar.title = file.name;
+    preview.appendChild(bar);
+    return bar.firstChild;
+  }
+
+  async function uploadFile(file) {
+    const bar = progressBar(file);
+    const body = new FormData();
+    body.append('filename', file.name);
+    body.append('size', file.size);
+    body.append('taken_by', form.querySelector('[name="taken_by"]').value);
+    body.append('date_taken', form.querySelector('[name="date_taken"]').value);
+    let status = await request(form.dataset.chunkedStartUrl, { method: 'POST', body: body });
+
+    let retries = 0;
+    while (!status.complete) {
+      bar.style.width = `${(100 * status.received) / status.size}%`;
+      const chunk = file.slice(status.received, status.received + status.chunk_size);
+      try {
+        status = await request(status.url, {
+          method: 'PUT',
+          body: chunk,
+          headers: { 'Upload-Offset': status.received },
+        });
+        retries = 0;
+      } catch (error) {
+        if (error.fatal || ++retries > maxRetries) throw error;
+        await sleep(1000 * 2 ** retries);
+        // Find out how much of the chunk made it before resuming
+        status = await request(status.url);
+      }
+    }
+    bar.style.width = '100%';
+    bar.classList.add('bg-success');
+  }
+
+  form.addEventListener('submit', async function (e) {
+    if (!fileInput.files.length) return;
+    e.preventDefault();
+    const button = form.querySelector('[type="submit"]');
+    button.disabled = true;
+    try {
+      for (const file of Array.from(fileInput.files)) {
+        await uploadFile(file);
+      }
+      window.location = form.dataset.successUrl;
+    } catch (error) {
+      alert(`Upload failed: ${error.message}\nSubmit again to resume.`);
+      button.disabled = false;
+    }
+  });
+});
@@ -0,0 +1,44 @@
+// Load each Photo Library panel's photos the first time it's opened,
+// and page through them inside the panel.
+document.addEventListener('DOMContentLoaded', function () {
+  function load(body, url) {
+    fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+      .then(response => {
+        if (!response.ok) throw new Error(response.statusText);
+        return response.text();
+      })
+      .then(html => {
+        body.innerHTML = html;
+        body.dataset.loaded = 'true';
+      })
+      .catch(error => {
+        body.innerHTML = `<p class="text-danger">Couldn't load photos: ${error.message}</p>`;
+      });
+  }
+
+  document.querySelectorAll('.accordion-collapse').forEach(panel => {
+    const body = panel.querySelector('[data-photos-url]');
+    if (!body) return;
+
+    panel.addEventListener('show.bs.collapse', () => {
+      if (!body.dataset.loaded) load(body, body.dataset.photosUrl);
+    });
+
+    // Pagination links inside the panel replace just the panel's photos
+    body.addEventListener('click', e => {
+      const link = e.target.closest('a.page-link');
+      if (!link) return;
+      e.preventDefault();
+      load(body, body.dataset.photosUrl + link.getAttribute('href'));
+    });
+
+    // So do the sort and filter form's results
+    body.addEventListener('submit', e => {
+      const form = e.target.closest('form.photo-filter');
+      if (!form) return;
+      e.preventDefault();
+      const query = new URLSearchParams(new FormData(form));
+      load(body, body.dataset.photosUrl + '?' + query);
+    });
+  });
+});
@@ -0,0 +1,35 @@
+// Poll the processing status of a fieldnote's photos and update the
+// badges on the gallery cards until every job is done or failed.
+document.addEventListener('DOMContentLoaded', function () {
+  const gallery = document.getElementById('photo-gallery');
+  if (!gallery || !gallery.querySelector('[data-photo-status]')) return;
+
+  const url = gallery.dataset.statusUrl;
+  const pollInterval = 5000;
+
+  function update() {
+    fetch(url, { headers: { 'Accept': 'application/json' } })
+      .then(response => response.json())
+      .then(data => {
+        let busy = false;
+        data.photos.forEach(job => {
+          const badge = gallery.querySelector(`[data-photo-status="${job.photo_id}"]`);
+          if (!badge) return;
+          if (job.status === 'done') {
+            badge.className = 'badge text-bg-success';
+            badge.textContent = 'Ready';
+          } else if (job.status === 'failed') {
+            badge.className = 'badge text-bg-danger';
+            badge.textContent = 'Processing failed';
+            badge.title = job.last_error;
+          } else {
+            busy = true;
+          }
+        });
+        if (busy) setTimeout(update, pollInterval);
+      })
+      .catch(() => setTimeout(update, pollInterval * 2));
+  }
+
+  setTimeout(update, pollInterval);
+});